@@ -7,3 +7,5 @@ class CtfpadConfig(AppConfig):
 
     def ready(self):
         import ctfpad.signals
+        from ctfpad.health import hedgedoc_health
+        hedgedoc_health.ensure_started()
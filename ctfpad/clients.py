@@ -0,0 +1,136 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ctftools.settings import (
+    HTTP_CLIENT_TIMEOUT,
+    HTTP_CLIENT_RETRIES,
+    HTTP_CLIENT_BACKOFF_FACTOR,
+    HTTP_CLIENT_POOL_SIZE,
+    HTTP_CLIENT_CIRCUIT_FAILURES,
+    HTTP_CLIENT_CIRCUIT_RESET_TIMEOUT,
+)
+
+
+class ServiceUnavailableError(requests.ConnectionError):
+    """
+    Raised without any network access when the circuit breaker of a service is open
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stop calling a service after `max_failures` consecutive failures, then let a single
+    request through every `reset_timeout` seconds to check whether it came back.
+    """
+    def __init__(self, name: str, max_failures: int, reset_timeout: float):
+        self.name = name
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def check(self) -> None:
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise ServiceUnavailableError(f"{self.name} is unavailable, not retrying before {self.reset_timeout}s")
+            # half-open: let this request probe the service, and hold the others back meanwhile
+            self.opened_at = time.monotonic()
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                self.opened_at = time.monotonic()
+
+
+class ServiceSession(requests.Session):
+    """
+    A `requests.Session` bound to a service: it uses the service connection pool, default timeouts,
+    retry policy and circuit breaker. Cookies stay private to the session.
+    """
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+        self.mount("http://", service.adapter)
+        self.mount("https://", service.adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", self.service.timeout)
+        self.service.breaker.check()
+        try:
+            res = super().request(method, url, *args, **kwargs)
+        except requests.RequestException:
+            self.service.breaker.record_failure()
+            raise
+
+        if res.status_code >= 500:
+            self.service.breaker.record_failure()
+        else:
+            self.service.breaker.record_success()
+        return res
+
+    def close(self):
+        # the adapter (hence the connection pool) is shared by all the sessions of the service
+        pass
+
+
+class Service:
+    """
+    An outbound integration (CTFTime, HedgeDoc, Discord...), with its own connection pool and circuit breaker
+    """
+    def __init__(self, name: str, timeout=HTTP_CLIENT_TIMEOUT, retries: int = HTTP_CLIENT_RETRIES):
+        self.name = name
+        self.timeout = timeout
+        self.adapter = HTTPAdapter(
+            pool_connections=HTTP_CLIENT_POOL_SIZE,
+            pool_maxsize=HTTP_CLIENT_POOL_SIZE,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=HTTP_CLIENT_BACKOFF_FACTOR,
+                status_forcelist=(502, 503, 504),
+                respect_retry_after_header=False,
+                raise_on_status=False,
+            ),
+        )
+        self.breaker = CircuitBreaker(name, HTTP_CLIENT_CIRCUIT_FAILURES, HTTP_CLIENT_CIRCUIT_RESET_TIMEOUT)
+
+    def __str__(self) -> str:
+        return self.name
+
+    def session(self) -> ServiceSession:
+        return ServiceSession(self)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        with self.session() as session:
+            return session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+ctftime = Service("ctftime")
+hedgedoc = Service("hedgedoc")
+discord = Service("discord")
@@ -0,0 +1,82 @@
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from ctfpad.clients import Service
+from ctftools.settings import (
+    HEDGEDOC_URL,
+    HEDGEDOC_INTERNAL_URL,
+    USE_INTERNAL_HEDGEDOC,
+    HEDGEDOC_HEALTH_CHECK_INTERVAL,
+)
+
+
+class ServiceHealthChecker(threading.Thread):
+    """
+    Background thread probing a list of candidate base URLs for the same service every `interval` seconds.
+    Request paths only read the last results from memory, and never touch the network: until the first round of
+    probes completes, they get the first candidate.
+    """
+    daemon = True
+
+    def __init__(self, name: str, urls: list, interval: int):
+        super().__init__(name=f"{name}-health-checker")
+        self.urls = urls
+        self.interval = interval
+        self.service = Service(f"{name}-probe", retries=0)
+        self.status = {url: {"up": None, "latency": None, "last_check": None} for url in urls}
+        self.start_lock = threading.Lock()
+
+    def ensure_started(self) -> None:
+        """Start the thread (from `CtfpadConfig.ready`), unless it already is
+        """
+        with self.start_lock:
+            if self.ident is None:
+                self.start()
+
+    def probe(self, url: str) -> None:
+        start = time.monotonic()
+        try:
+            res = self.service.get(url, allow_redirects=False)
+            up = res.status_code < 500
+        except requests.RequestException:
+            up = False
+        self.status[url] = {
+            "up": up,
+            "latency": round(time.monotonic() - start, 3) if up else None,
+            "last_check": datetime.now(),
+        }
+
+    def probe_all(self) -> None:
+        for url in self.urls:
+            self.probe(url)
+
+    def run(self) -> None:
+        while True:
+            self.probe_all()
+            time.sleep(self.interval)
+
+    @property
+    def base_url(self) -> str:
+        """The first candidate URL found up by the last probe, the first candidate if none was."""
+        self.ensure_started()
+        for url in self.urls:
+            if self.status[url]["up"]:
+                return url
+        return self.urls[0]
+
+
+def hedgedoc_candidate_urls() -> list:
+    """The configured HedgeDoc URL, then the docker container one so that ctfpad works out of the box with
+    `docker-compose up` as most people wanting to trial it out won't bother changing the default values
+    with public FQDN/IPs.
+    """
+    urls = [HEDGEDOC_URL]
+    if USE_INTERNAL_HEDGEDOC or HEDGEDOC_URL == 'http://localhost:3000':
+        urls.append(HEDGEDOC_INTERNAL_URL)
+    return urls
+
+
+hedgedoc_health = ServiceHealthChecker("hedgedoc", hedgedoc_candidate_urls(), HEDGEDOC_HEALTH_CHECK_INTERVAL)
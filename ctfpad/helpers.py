@@ -1,6 +1,8 @@
 from datetime import datetime
 from time import time
 from django.utils.crypto import get_random_string
+import hashlib
+import io
 import magic
 import os
 import pathlib
@@ -8,18 +10,27 @@ import requests
 import smtplib
 import exrex
 
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from uuid import uuid4
+from PIL import Image
+
+from ctfpad import clients
+from ctfpad.health import hedgedoc_health
 
 from ctftools.settings import (
     CTFPAD_HOSTNAME, CTFPAD_PORT, CTFPAD_USE_SSL,
     CTFPAD_ACCEPTED_IMAGE_EXTENSIONS,
     CTFPAD_DEFAULT_CTF_LOGO,
+    CTF_LOGO_ROOT,
+    CTF_LOGO_MAX_SIZE,
+    CTF_LOGO_ACCEPTED_FORMATS,
+    CTF_LOGO_THUMBNAIL_SIZES,
     HEDGEDOC_URL,
-    USE_INTERNAL_HEDGEDOC,
     STATIC_URL,
     CTFTIME_API_EVENTS_URL,
     CTFTIME_USER_AGENT,
+    CTFTIME_MAX_CONCURRENT_REQUESTS,
     EMAIL_HOST, EMAIL_HOST_USER, EMAIL_HOST_PASSWORD,
     DISCORD_WEBHOOK_URL,
     EXCALIDRAW_ROOM_ID_PATTERN,
@@ -35,21 +46,18 @@ def get_current_site() -> str:
     return r
 
 
-@lru_cache(maxsize=1)
 def which_hedgedoc() -> str:
     """Returns the docker container hostname if the default URL from the config is not accessible.
     This is so that ctfpad works out of the box with `docker-compose up` as most people wanting to
     trial it out won't bother changing the default values with public FQDN/IPs.
 
+    The answer comes from the last probe of the background health checker, so it costs no network access
+    and follows HedgeDoc coming up or going down.
+
     Returns:
         str: the base HedgeDoc URL
     """
-    try:
-        requests.get(HEDGEDOC_URL)
-    except:
-        if USE_INTERNAL_HEDGEDOC or HEDGEDOC_URL == 'http://localhost:3000':
-            return 'http://hedgedoc:3000'
-    return HEDGEDOC_URL
+    return hedgedoc_health.base_url
 
 
 def register_new_hedgedoc_user(username: str, password: str) -> bool:
@@ -63,11 +71,14 @@ def register_new_hedgedoc_user(username: str, password: str) -> bool:
     Returns:
         bool: if the register action succeeded, returns True; False in any other cases
     """
-    res = requests.post(
-        which_hedgedoc() + '/register',
-        data={'email': username, 'password': password},
-        allow_redirects = False
-    )
+    try:
+        res = clients.hedgedoc.post(
+            which_hedgedoc() + '/register',
+            data={'email': username, 'password': password},
+            allow_redirects = False
+        )
+    except requests.RequestException:
+        return False
 
     if res.status_code != requests.codes.found:
         return False
@@ -93,10 +104,100 @@ def check_note_id(id: str) -> bool:
     Returns:
         bool: returns True if it exists
     """
-    res = requests.head( f"{HEDGEDOC_URL}/{id}" )
+    res = clients.hedgedoc.head( f"{HEDGEDOC_URL}/{id}" )
     return res.status_code == requests.codes.found
 
 
+def hedgedoc_login(session, member) -> bool:
+    """Log a HedgeDoc session in as the member, so that it gets the member privileges on the notes.
+
+    Args:
+        session (requests.Session): the HedgeDoc session
+        member (Member): the member to impersonate
+
+    Returns:
+        bool: True if the login succeeded
+    """
+    try:
+        res = session.post(f"{which_hedgedoc()}/login", data={"email": member.hedgedoc_username, "password": member.hedgedoc_password})
+    except requests.RequestException:
+        return False
+    return res.status_code == requests.codes.ok
+
+
+def hedgedoc_logout(session) -> None:
+    """Log a HedgeDoc session out.
+
+    Args:
+        session (requests.Session): the HedgeDoc session
+    """
+    try:
+        session.post(f"{which_hedgedoc()}/logout")
+    except requests.RequestException:
+        pass
+
+
+def hedgedoc_get_note_info(session, note_id: str) -> dict:
+    """Retrieve the metadata of a note (title, description, createtime, updatetime...), which is much
+    cheaper than downloading it.
+
+    Args:
+        session (requests.Session): the HedgeDoc session
+        note_id (str): the note ID
+
+    Returns:
+        dict: the note information with `updatetime` parsed as a datetime, or None if it could not be retrieved
+    """
+    try:
+        res = session.get(f"{which_hedgedoc()}{note_id}/info")
+        if res.status_code != requests.codes.ok:
+            return None
+        info = res.json()
+        info["updatetime"] = ctftime_parse_date(info["updatetime"])
+    except (requests.RequestException, ValueError, KeyError, TypeError):
+        return None
+    return info
+
+
+def hedgedoc_download_note(session, note_id: str) -> str:
+    """Download the markdown body of a note.
+
+    Args:
+        session (requests.Session): the HedgeDoc session
+        note_id (str): the note ID
+
+    Returns:
+        str: the body of the note, or None if it could not be retrieved
+    """
+    try:
+        res = session.get(f"{which_hedgedoc()}{note_id}/download")
+    except requests.RequestException:
+        return None
+    return res.text if res.status_code == requests.codes.ok else None
+
+
+def hedgedoc_export_note(session, note_id: str, snapshots: dict) -> str:
+    """Retrieve the body of a note as the session is allowed to read it: its local snapshot is only used when the
+    note information the session gets shows the snapshot is up to date, the note is downloaded otherwise.
+
+    Args:
+        session (requests.Session): the HedgeDoc session
+        note_id (str): the note ID
+        snapshots (dict): the (update time, body) of the local snapshots, indexed by note ID
+
+    Returns:
+        str: the body of the note, or None if it could not be retrieved
+    """
+    if note_id in snapshots:
+        info = hedgedoc_get_note_info(session, note_id)
+        if not info:
+            return None
+        update_time, body = snapshots[note_id]
+        if info["updatetime"] == update_time:
+            return body
+    return hedgedoc_download_note(session, note_id)
+
+
 def get_file_magic(fpath: pathlib.Path) -> str:
     """Returns the file description from its magic number (ex. 'PE32+ executable (console) x86-64, for MS Windows' )
 
@@ -134,28 +235,6 @@ def ctftime_parse_date(date: str) -> datetime:
     return datetime.strptime(date[:19], "%Y-%m-%dT%H:%M:%S")
 
 
-def ctftime_ctfs(running=True, future=True) -> list:
-    """Return CTFs that are currently running and starting in the next 6 months.
-
-    Returns:
-        list: current and future CTFs
-    """
-    ctfs = ctftime_fetch_ctfs()
-    now = datetime.now()
-
-    result = []
-    for ctf in ctfs:
-        start = ctf['start']
-        finish = ctf['finish']
-
-        if running and start < now < finish:
-            result.append(ctf)
-        if future and now < start < finish:
-            result.append(ctf)
-
-    return result
-
-
 def ctftime_fetch_ctfs(limit=100) -> list:
     """Retrieve CTFs from CTFTime API with a wide start/finish window (-1/+26 weeks) so we can later run our own filters
     on the cached results for better performance and accuracy.
@@ -163,7 +242,7 @@ def ctftime_fetch_ctfs(limit=100) -> list:
     Returns:
         list: JSON output from CTFTime
     """
-    res = requests.get(f"{CTFTIME_API_EVENTS_URL}?limit={limit}&start={time()-(3600*24*60):.0f}&finish={time()+(3600*24*7*26):.0f}",
+    res = clients.ctftime.get(f"{CTFTIME_API_EVENTS_URL}?limit={limit}&start={time()-(3600*24*60):.0f}&finish={time()+(3600*24*7*26):.0f}",
         headers={"user-agent": CTFTIME_USER_AGENT})
     if res.status_code != requests.codes.ok:
         raise RuntimeError(f"CTFTime service returned HTTP code {res.status_code} (expected {requests.codes.ok}): {res.reason}")
@@ -189,35 +268,91 @@ def ctftime_get_ctf_info(ctftime_id: int) -> dict:
         dict: JSON output from CTFTime
     """
     url = f"{CTFTIME_API_EVENTS_URL}{ctftime_id}/"
-    res = requests.get(url, headers={"user-agent": CTFTIME_USER_AGENT})
+    res = clients.ctftime.get(url, headers={"user-agent": CTFTIME_USER_AGENT})
     if res.status_code != requests.codes.ok:
         raise RuntimeError(f"CTFTime service returned HTTP code {res.status_code} (expected {requests.codes.ok}): {res.reason}")
     result = res.json()
     return result
 
 
-@lru_cache(maxsize=128)
-def ctftime_get_ctf_logo_url(ctftime_id: int) -> str:
-    """[summary]
+def ctftime_parse_logo_url(ctf_info: dict) -> str:
+    """Extract the logo URL from the CTFTime information of a CTF, falling back to the default logo
+    if it is missing or not an accepted image format.
 
     Args:
-        ctftime_id (int): [description]
+        ctf_info (dict): JSON output from CTFTime
 
     Returns:
-        str: [description]
+        str: the logo URL
     """
     default_logo = f"{STATIC_URL}images/{CTFPAD_DEFAULT_CTF_LOGO}"
-    try:
-        ctf_info = ctftime_get_ctf_info(ctftime_id)
-        logo = ctf_info.setdefault("logo", default_logo)
-        _, ext = os.path.splitext(logo)
-        if ext.lower() not in CTFPAD_ACCEPTED_IMAGE_EXTENSIONS:
-            return default_logo
-    except:
-        logo = default_logo
+    logo = ctf_info.get("logo") or default_logo
+    _, ext = os.path.splitext(logo)
+    if ext.lower() not in CTFPAD_ACCEPTED_IMAGE_EXTENSIONS:
+        return default_logo
     return logo
 
 
+def ctftime_fetch_ctf_logo_urls(ctftime_ids: list) -> dict:
+    """Retrieve concurrently the logo URLs of several CTFs from CTFTime, with at most
+    `CTFTIME_MAX_CONCURRENT_REQUESTS` requests in flight.
+
+    Args:
+        ctftime_ids (list): CTFTime event IDs
+
+    Returns:
+        dict: the logo URL indexed by CTFTime event ID. Events that could not be retrieved are left out,
+        so that they can be retried later.
+    """
+    def fetch(ctftime_id: int) -> str:
+        try:
+            return ctftime_parse_logo_url(ctftime_get_ctf_info(ctftime_id))
+        except Exception:
+            return ""
+
+    ids = set(ctftime_ids)
+    if not ids:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(len(ids), CTFTIME_MAX_CONCURRENT_REQUESTS)) as pool:
+        logos = dict(zip(ids, pool.map(fetch, ids)))
+
+    return {ctftime_id: logo for ctftime_id, logo in logos.items() if logo}
+
+
+
+def mirror_ctf_logo(logo_url: str) -> str:
+    """Download a CTF logo, and store it locally as downscaled PNG thumbnails (one per size of
+    `CTF_LOGO_THUMBNAIL_SIZES`) under `CTF_LOGO_ROOT`. Thumbnails are named after the hash of the
+    original image, so they never change once written.
+
+    Args:
+        logo_url (str): the URL of the logo to mirror
+
+    Returns:
+        str: the thumbnail name prefix if successful; an empty string otherwise
+    """
+    try:
+        res = clients.ctftime.get(logo_url, headers={"user-agent": CTFTIME_USER_AGENT})
+        if res.status_code != requests.codes.ok or len(res.content) > CTF_LOGO_MAX_SIZE:
+            return ""
+        # trust the decoded content, not the URL suffix
+        image = Image.open(io.BytesIO(res.content))
+        if image.format not in CTF_LOGO_ACCEPTED_FORMATS:
+            return ""
+        image.load()
+    except Exception:
+        return ""
+
+    name = hashlib.sha256(res.content).hexdigest()[:16]
+    CTF_LOGO_ROOT.mkdir(parents=True, exist_ok=True)
+    for size in CTF_LOGO_THUMBNAIL_SIZES.values():
+        thumbnail = image.convert("RGBA")
+        thumbnail.thumbnail((size, size), Image.LANCZOS)
+        thumbnail.save(CTF_LOGO_ROOT / f"{name}-{size}.png", "PNG")
+    return name
+
+
 
 def send_mail(recipients: list, subject: str, body: str) -> bool:
     """[summary]
@@ -271,7 +406,7 @@ def discord_send_message(js: dict) -> bool:
         return False
 
     try:
-        h = requests.post(DISCORD_WEBHOOK_URL, json=js)
+        h = clients.discord.post(DISCORD_WEBHOOK_URL, json=js)
         if h.status_code not in (200, 204):
             raise Exception(f"Incorrect response, got {h.status_code}")
 
@@ -307,27 +442,46 @@ date: {date}
     return content
 
 
-def export_challenge_note(member, note_id: uuid4) -> str:
+def export_challenge_note(member, note_id: uuid4, snapshots: dict = None) -> str:
     """Export a challenge note. `member` is required for privilege requirements
 
     Args:
         member (Member): [description]
         note_id (uuid.uuid4): [description]
+        snapshots (dict): the local snapshots usable in place of the download (see `hedgedoc_export_note`)
 
     Returns:
         str: The body of the note if successful; an empty string otherwise
     """
     result = ""
-    with requests.Session() as session:
-        h = session.post(f"{HEDGEDOC_URL}/login", data={"email": member.hedgedoc_username, "password": member.hedgedoc_password})
-        if h.status_code == requests.codes.ok:
-            h2 = session.get(f"{HEDGEDOC_URL}{note_id}/download")
-            if h2.status_code == requests.codes.ok:
-                result = h2.text
-            session.post(f"{HEDGEDOC_URL}/logout")
+    with clients.hedgedoc.session() as session:
+        if hedgedoc_login(session, member):
+            result = hedgedoc_export_note(session, note_id, snapshots or {}) or ""
+            hedgedoc_logout(session)
     return result
 
 
+class ZipStreamBuffer(io.RawIOBase):
+    """A write-only, non-seekable buffer for `zipfile.ZipFile`: the archive is produced in order, and
+    the bytes written so far can be popped out to be streamed to the client as soon as they are ready.
+    """
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
 def generate_excalidraw_room_id() -> str:
     return exrex.getone(EXCALIDRAW_ROOM_ID_PATTERN)
 
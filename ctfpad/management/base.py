@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+class PeriodicCommand(BaseCommand):
+    """
+    Management command that runs its job once, or forever every `--interval` seconds
+    when used as a background worker (see `docker-compose.yml`).
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Run the job every INTERVAL seconds instead of once",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            close_old_connections()
+            try:
+                self.handle_once(*args, **options)
+            except Exception as e:
+                if not interval:
+                    raise
+                # a worker must survive a failed run, the next one may succeed
+                self.stderr.write(f"{self.__class__.__module__}: {e}")
+
+            if not interval:
+                return
+            time.sleep(interval)
+
+    def handle_once(self, *args, **options):
+        raise NotImplementedError("subclasses of PeriodicCommand must provide a handle_once() method")
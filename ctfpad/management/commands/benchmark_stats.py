@@ -0,0 +1,73 @@
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from ctfpad.models import Challenge, Ctf, CtfStats, Member, MemberCtfScore, MemberYearStats, Team
+
+
+class Command(BaseCommand):
+    help = "Time the computation of the stats page on generated CTFs & members, which are rolled back afterwards"
+
+    # far enough in the past not to mix with the real CTFs
+    YEAR = 1999
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ctfs", type=int, default=200, help="Number of generated CTFs (default: 200)")
+        parser.add_argument("--members", type=int, default=50, help="Number of generated members (default: 50)")
+        parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs (default: 5)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.generate(options["ctfs"], options["members"])
+            stats = CtfStats(self.YEAR)
+            # evaluated the way `CtfStats.cached_stats` does
+            for name, func in (
+                ("player_activity", stats.player_activity),
+                ("category_stats", lambda: list(stats.category_stats())),
+                ("ctf_stats", stats.ctf_stats),
+                ("ranking_stats", stats.ranking_stats),
+            ):
+                self.benchmark(name, func, options["repeat"])
+            transaction.set_rollback(True)
+
+    def generate(self, ctf_count: int, member_count: int) -> None:
+        """Every CTF has one challenge, solved by a fifth of the members"""
+        suffix = uuid.uuid4().hex[:8]
+        team = Team.objects.create(name=f"benchmark-{suffix}", email=f"benchmark-{suffix}@ctfpad.localdomain")
+        users = User.objects.bulk_create(User(username=f"benchmark-{suffix}-{j}") for j in range(member_count))
+        members = Member.objects.bulk_create(Member(user=user, team=team) for user in users)
+
+        start = datetime(self.YEAR, 1, 1)
+        ctfs = Ctf.objects.bulk_create(
+            Ctf(name=f"benchmark-{suffix}-{i}", visibility="public", rating=10.0, start_date=start + timedelta(days=i), end_date=start + timedelta(days=i, hours=12))
+            for i in range(ctf_count)
+        )
+        challenges = Challenge.objects.bulk_create(
+            Challenge(name=f"benchmark-{i}", ctf=ctf, points=100, flag="flag", status="solved") for i, ctf in enumerate(ctfs)
+        )
+        Challenge.solvers.through.objects.bulk_create(
+            Challenge.solvers.through(challenge=challenge, member=member)
+            for i, challenge in enumerate(challenges)
+            for j, member in enumerate(members)
+            if (i + j) % 5 == 0
+        )
+        member_ids = MemberCtfScore.refresh([ctf.pk for ctf in ctfs])
+        MemberYearStats.refresh(member_ids)
+        self.stdout.write(f"Generated {ctf_count} CTF(s) and {member_count} member(s) in {self.YEAR}")
+
+    def benchmark(self, name: str, func, repeat: int) -> None:
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f"{name}: best {min(timings):.1f} ms, median {statistics.median(timings):.1f} ms, {len(queries)} queries"
+        )
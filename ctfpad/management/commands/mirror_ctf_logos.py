@@ -0,0 +1,12 @@
+from ctfpad.management.base import PeriodicCommand
+from ctfpad.models import Ctf
+
+
+class Command(PeriodicCommand):
+    help = "Download the CTFTime logos of the registered CTFs, and store their local thumbnails"
+
+    def handle_once(self, *args, **options):
+        ctfs = list(Ctf.objects.exclude(ctftime_id=0).exclude(ctftime_id__isnull=True).filter(ctftime_logo_thumbnail=""))
+        Ctf.resolve_ctftime_logos(ctfs)
+        count = Ctf.mirror_ctftime_logos(ctfs)
+        self.stdout.write(f"Mirrored {count} CTF logo(s)")
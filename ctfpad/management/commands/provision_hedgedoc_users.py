@@ -0,0 +1,11 @@
+from ctfpad.management.base import PeriodicCommand
+from ctfpad.models import HedgedocProvisioningJob
+
+
+class Command(PeriodicCommand):
+    help = "Create the pending HedgeDoc accounts of members"
+
+    def handle_once(self, *args, **options):
+        count = HedgedocProvisioningJob.run_due()
+        if count:
+            self.stdout.write(f"Processed {count} HedgeDoc provisioning job(s)")
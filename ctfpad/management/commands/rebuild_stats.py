@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ctfpad.models import CategoryYearStats, CtfStats, MemberCtfScore, MemberYearStats
+
+
+class Command(BaseCommand):
+    help = "Recompute the statistics tables (CTF scores, yearly activity and category solves) from scratch"
+
+    def handle(self, *args, **options):
+        CtfStats.rebuild()
+        self.stdout.write(
+            f"Rebuilt {MemberCtfScore.objects.count()} CTF score(s), {MemberYearStats.objects.count()} yearly "
+            f"activity row(s) and {CategoryYearStats.objects.count()} category row(s)"
+        )
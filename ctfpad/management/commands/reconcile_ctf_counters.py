@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ctfpad.models import Ctf
+
+
+class Command(BaseCommand):
+    help = "Recompute the progress counters (challenges, solves and points) of the CTFs where they drifted from their challenges"
+
+    def handle(self, *args, **options):
+        count = Ctf.reconcile_counters()
+        self.stdout.write(f"Reconciled the counters of {count} CTF(s)")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from ctfpad.models import Member
+
+
+class Command(BaseCommand):
+    help = "Queue again the HedgeDoc account creation of the members left in anonymous mode"
+
+    def handle(self, *args, **options):
+        members = Member.objects.filter(
+            Q(hedgedoc_status="failed") |
+            Q(hedgedoc_status="provisioned", hedgedoc_password="") |
+            Q(hedgedoc_status="provisioned", hedgedoc_password__isnull=True)
+        )
+
+        count = 0
+        for member in members:
+            member.hedgedoc_status = "pending"
+            member.save(update_fields=["hedgedoc_status"])
+            count += 1
+
+        self.stdout.write(f"Queued {count} member(s) for HedgeDoc provisioning")
@@ -0,0 +1,10 @@
+from ctfpad.management.base import PeriodicCommand
+from ctfpad.models import CtftimeEvent
+
+
+class Command(PeriodicCommand):
+    help = "Mirror the running and upcoming CTFTime events into the local database"
+
+    def handle_once(self, *args, **options):
+        count = CtftimeEvent.sync()
+        self.stdout.write(f"Synchronized {count} CTFTime event(s)")
@@ -0,0 +1,27 @@
+from django.core.management.base import CommandError
+
+from ctfpad.management.base import PeriodicCommand
+from ctfpad.models import Member, NoteSnapshot
+
+
+class Command(PeriodicCommand):
+    help = "Mirror the HedgeDoc notes changed since the last run into the local database"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--member",
+            help="Username of the member impersonated on HedgeDoc (default: the first admin with a HedgeDoc account)",
+        )
+
+    def handle_once(self, *args, **options):
+        members = Member.objects.select_related("user").filter(hedgedoc_status="provisioned").exclude(hedgedoc_password="")
+        if options["member"]:
+            member = members.filter(user__username=options["member"]).first()
+        else:
+            member = members.filter(user__is_superuser=True).order_by("creation_time").first()
+        if not member:
+            raise CommandError("No member with a HedgeDoc account to synchronize the notes with")
+
+        count = NoteSnapshot.sync(member)
+        self.stdout.write(f"Synchronized {count} note(s)")
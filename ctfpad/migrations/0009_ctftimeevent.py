@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctfpad', '0008_remove_challenge_whiteboard_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CtftimeEvent',
+            fields=[
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('last_modification_time', models.DateTimeField(auto_now=True)),
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=256)),
+                ('description', models.TextField(blank=True)),
+                ('url', models.URLField(blank=True, max_length=512)),
+                ('logo', models.URLField(blank=True, max_length=512)),
+                ('weight', models.FloatField(default=0.0)),
+                ('start', models.DateTimeField(db_index=True)),
+                ('finish', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['start'],
+            },
+        ),
+    ]
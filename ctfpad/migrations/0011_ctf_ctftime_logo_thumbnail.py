@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctfpad', '0010_ctf_ctftime_logo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ctf',
+            name='ctftime_logo_thumbnail',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
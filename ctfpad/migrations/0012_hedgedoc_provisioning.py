@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:21
+
+import ctfpad.helpers
+import datetime
+import django.db.models.deletion
+import model_utils.fields
+from django.db import migrations, models
+
+def set_hedgedoc_status(apps, schema_editor):
+    # existing members went through the synchronous registration: empty password == anonymous mode
+    Member = apps.get_model('ctfpad', 'Member')
+    Member.objects.exclude(hedgedoc_password__isnull=True).exclude(hedgedoc_password='').update(hedgedoc_status='provisioned')
+    Member.objects.filter(hedgedoc_status='pending').update(hedgedoc_status='failed')
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctfpad', '0011_ctf_ctftime_logo_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='hedgedoc_status',
+            field=model_utils.fields.StatusField(choices=[('pending', 'pending'), ('provisioned', 'provisioned'), ('failed', 'failed')], default='pending', max_length=100, no_check_for_status=True),
+        ),
+        migrations.CreateModel(
+            name='HedgedocProvisioningJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('last_modification_time', models.DateTimeField(auto_now=True)),
+                ('password', models.CharField(default=ctfpad.helpers.get_random_string_64, max_length=64)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_time', models.DateTimeField(db_index=True, default=datetime.datetime.now)),
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='hedgedoc_provisioning_job', to='ctfpad.member')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(set_hedgedoc_status, migrations.RunPython.noop),
+    ]
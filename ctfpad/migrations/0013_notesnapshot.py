@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctfpad', '0012_hedgedoc_provisioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('last_modification_time', models.DateTimeField(auto_now=True)),
+                ('note_id', models.CharField(max_length=38, unique=True)),
+                ('body', models.TextField(blank=True)),
+                ('checksum', models.CharField(max_length=64)),
+                ('note_update_time', models.DateTimeField(null=True)),
+                ('last_sync_time', models.DateTimeField(db_index=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from ctftools.settings import SEARCH_CONFIG
+
+
+def index_note_snapshots(apps, schema_editor):
+    NoteSnapshot = apps.get_model('ctfpad', 'NoteSnapshot')
+    NoteSnapshot.objects.update(search_vector=django.contrib.postgres.search.SearchVector('body', config=SEARCH_CONFIG))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctfpad', '0013_notesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notesnapshot',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notesnapshot',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='ctfpad_note_search__c1535f_gin'),
+        ),
+        migrations.RunPython(index_note_snapshots, migrations.RunPython.noop),
+    ]
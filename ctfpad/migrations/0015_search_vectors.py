@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:26
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+from ctftools.settings import SEARCH_CONFIG
+
+
+def index_search_vectors(apps, schema_editor):
+    Ctf = apps.get_model('ctfpad', 'Ctf')
+    Challenge = apps.get_model('ctfpad', 'Challenge')
+    Member = apps.get_model('ctfpad', 'Member')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    for model in (Ctf, Challenge):
+        model.objects.update(
+            search_vector=SearchVector('name', weight='A', config=SEARCH_CONFIG) + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        )
+
+    user = User.objects.filter(pk=OuterRef('user_id'))
+    Member.objects.update(
+        search_vector=SearchVector(Subquery(user.values('username')), Subquery(user.values('email')), weight='A', config=SEARCH_CONFIG) +
+                      SearchVector('description', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctfpad', '0014_notesnapshot_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='challenge',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ctf',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='challenge',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='ctfpad_chal_search__e4d4ee_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='ctf',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='ctfpad_ctf_search__b31fc2_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='ctfpad_memb_search__050f1b_gin'),
+        ),
+        migrations.RunPython(index_search_vectors, migrations.RunPython.noop),
+    ]
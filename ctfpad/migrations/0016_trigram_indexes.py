@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:28
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctfpad', '0015_search_vectors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='challenge',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='ctfpad_challenge_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='challengecategory',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='ctfpad_category_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='ctf',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='ctfpad_ctf_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='ctfpad_tag_name_trgm'),
+        ),
+        # auth_user belongs to django.contrib.auth, so its index can't be declared on the model
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS ctfpad_user_username_trgm ON auth_user USING gin (UPPER(username) gin_trgm_ops)',
+            'DROP INDEX IF EXISTS ctfpad_user_username_trgm',
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:35
+
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractYear
+
+
+def build_stats(apps, schema_editor):
+    Challenge = apps.get_model('ctfpad', 'Challenge')
+    MemberCtfScore = apps.get_model('ctfpad', 'MemberCtfScore')
+    MemberYearStats = apps.get_model('ctfpad', 'MemberYearStats')
+    CategoryYearStats = apps.get_model('ctfpad', 'CategoryYearStats')
+    Solve = Challenge.solvers.through
+
+    rows = list(Solve.objects.values_list('challenge__ctf', 'challenge', 'member', 'challenge__points'))
+    solver_counts = Counter(challenge_id for _, challenge_id, _, _ in rows)
+    scores = {}
+    for ctf_id, challenge_id, member_id, points in rows:
+        score = scores.setdefault((ctf_id, member_id), MemberCtfScore(ctf_id=ctf_id, member_id=member_id))
+        score.points += points / solver_counts[challenge_id]
+        score.solve_count += 1
+    MemberCtfScore.objects.bulk_create(scores.values())
+
+    MemberYearStats.objects.bulk_create(
+        MemberYearStats(member_id=row['member'], year=row['year'], play_count=row['play_count'])
+        for row in MemberCtfScore.objects.filter(ctf__start_date__isnull=False).values(
+            'member', year=ExtractYear('ctf__start_date')
+        ).annotate(play_count=Count('ctf'))
+    )
+
+    CategoryYearStats.objects.bulk_create(
+        CategoryYearStats(category_id=row['challenge__category'], year=row['year'], solve_count=row['solve_count'])
+        for row in Solve.objects.filter(challenge__category__isnull=False, challenge__ctf__start_date__isnull=False).values(
+            'challenge__category', year=ExtractYear('challenge__ctf__start_date')
+        ).annotate(solve_count=Count('id'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctfpad', '0016_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryYearStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('last_modification_time', models.DateTimeField(auto_now=True)),
+                ('year', models.IntegerField()),
+                ('solve_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='year_stats', to='ctfpad.challengecategory')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'year'), name='ctfpad_categoryyearstats_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MemberCtfScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('last_modification_time', models.DateTimeField(auto_now=True)),
+                ('points', models.FloatField(default=0.0)),
+                ('solve_count', models.IntegerField(default=0)),
+                ('ctf', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='member_scores', to='ctfpad.ctf')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ctf_scores', to='ctfpad.member')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ctf', 'member'), name='ctfpad_memberctfscore_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MemberYearStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('last_modification_time', models.DateTimeField(auto_now=True)),
+                ('year', models.IntegerField()),
+                ('play_count', models.IntegerField(default=0)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='year_stats', to='ctfpad.member')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('member', 'year'), name='ctfpad_memberyearstats_unique')],
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_challenges(apps, schema_editor):
+    Ctf = apps.get_model('ctfpad', 'Ctf')
+    Challenge = apps.get_model('ctfpad', 'Challenge')
+
+    challenges = Challenge.objects.filter(ctf=OuterRef('pk')).order_by().values('ctf')
+    solved = challenges.filter(status='solved')
+    Ctf.objects.update(
+        challenge_count=Coalesce(Subquery(challenges.annotate(count=Count('id')).values('count')), 0),
+        solved_count=Coalesce(Subquery(solved.annotate(count=Count('id')).values('count')), 0),
+        total_points=Coalesce(Subquery(challenges.annotate(points=Sum('points')).values('points')), 0),
+        scored_points=Coalesce(Subquery(solved.annotate(points=Sum('points')).values('points')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctfpad', '0017_stats_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ctf',
+            name='challenge_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ctf',
+            name='scored_points',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ctf',
+            name='solved_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ctf',
+            name='total_points',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_challenges, migrations.RunPython.noop),
+    ]
@@ -5,43 +5,72 @@ import hashlib
 from urllib.parse import quote
 from datetime import date, datetime, timedelta
 from pathlib import Path
-from collections import namedtuple, Counter
-from statistics import mean
+from collections import deque, namedtuple, Counter
+from statistics import fmean
+import itertools
 import zipfile
 import requests
-import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
-from django.db import models
-from django.db.models import Sum, Count, Q
-from django.db.models.functions import TruncMonth
+from django.db import connection, models, transaction
+from django.db.models import Sum, Count, Exists, Max, Min, Q, F, OuterRef, Subquery, Value, Window
+from django.db.models.functions import Cast, Coalesce, ExtractMonth, ExtractYear, NullIf, RowNumber, Upper
+from django.db.models.lookups import Contains
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector, SearchVectorField, TrigramWordSimilarity
 from django.urls.base import reverse
 from django.utils.text import slugify
-from django.utils.crypto import get_random_string
 from django.utils.functional import cached_property
 from model_utils.fields import MonitorField, StatusField
 from model_utils import Choices, FieldTracker
 
-from ctfpad.helpers import ctftime_ctfs
-
 from ctftools.settings import (
     EXCALIDRAW_ROOM_ID_PATTERN, EXCALIDRAW_ROOM_KEY_PATTERN, HEDGEDOC_URL, SHORT_DATETIME_FORMAT,
     EXCALIDRAW_URL,
     CTF_CHALLENGE_FILE_PATH,
     CTF_CHALLENGE_FILE_ROOT, STATIC_URL,
+    CTFPAD_DEFAULT_CTF_LOGO,
+    CTF_LOGO_URL,
+    CTF_LOGO_THUMBNAIL_SIZES,
+    CTFTIME_MAX_CONCURRENT_REQUESTS,
     USERS_FILE_PATH,
     CTFTIME_URL,
     JITSI_URL,
+    HEDGEDOC_PROVISIONING_MAX_ATTEMPTS,
+    HEDGEDOC_PROVISIONING_RETRY_DELAY,
+    HEDGEDOC_PROVISIONING_CLAIM_TIMEOUT,
+    HEDGEDOC_EXPORT_MAX_CONCURRENT_REQUESTS,
+    HEDGEDOC_SYNC_MAX_CONCURRENT_REQUESTS,
+    NOTE_SNAPSHOT_FREEZE_DELAY,
+    SEARCH_CONFIG,
+    SEARCH_TIMEOUT,
+    SEARCH_MAX_CONCURRENT_QUERIES,
+    SEARCH_CACHE_TIMEOUT,
+    STATS_CACHE_TIMEOUT,
+    SCORE_GRAPH_MAX_POINTS,
 )
+from ctfpad import clients
 from ctfpad.validators import challenge_file_max_size_validator
 from ctfpad.helpers import (
     get_random_string_128, get_random_string_64, register_new_hedgedoc_user,
+    hedgedoc_login,
+    hedgedoc_logout,
+    hedgedoc_export_note,
+    hedgedoc_get_note_info,
+    hedgedoc_download_note,
+    ZipStreamBuffer,
     create_new_note,
     get_file_magic,
     get_file_mime,
-    ctftime_get_ctf_logo_url,
+    ctftime_fetch_ctfs,
+    ctftime_fetch_ctf_logo_urls,
+    ctftime_parse_logo_url,
+    mirror_ctf_logo,
     generate_excalidraw_room_id,
     generate_excalidraw_room_key,
 )
@@ -84,9 +113,8 @@ class Team(TimeStampedModel):
 
     @property
     def members(self):
-        members = sorted(self.member_set.filter(status = "member"), key=lambda x: x.username)
-        members+= sorted(self.member_set.filter(status = "guest"), key=lambda x: x.username)
-        return members
+        members = self.member_set.with_stats()
+        return sorted(members, key=lambda x: (x.status != "member", x.username))
 
 
 
@@ -108,14 +136,37 @@ class Ctf(TimeStampedModel):
     team_login = models.CharField(max_length=128, blank=True)
     team_password = models.CharField(max_length=128, blank=True)
     ctftime_id = models.IntegerField(default=0, blank=True, null=True)
+    ctftime_logo = models.CharField(max_length=512, blank=True)
+    ctftime_logo_thumbnail = models.CharField(max_length=64, blank=True)
     visibility = StatusField(choices_name="VISIBILITY")
     weight = models.FloatField(default=1.0)
     rating = models.FloatField(default=0.0)
     note_id = models.CharField(default=create_new_note, max_length=38, blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # progress counters, kept up to date by the challenge signals (see `update_counters`)
+    challenge_count = models.IntegerField(default=0, editable=False)
+    solved_count = models.IntegerField(default=0, editable=False)
+    total_points = models.IntegerField(default=0, editable=False)
+    scored_points = models.IntegerField(default=0, editable=False)
+    start_date_tracker = FieldTracker(fields=['start_date',])
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"]),
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="ctfpad_ctf_name_trgm"),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    @classmethod
+    def refresh_search_vector(cls, **filters) -> int:
+        """Recompute the full-text search document (name, then description) of the matching CTFs
+        """
+        return cls.objects.filter(**filters).update(
+            search_vector=SearchVector("name", weight="A", config=SEARCH_CONFIG) + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+        )
+
     @property
     def is_permanent(self) -> bool:
         return not self.start_date and not self.end_date
@@ -142,23 +193,63 @@ class Ctf(TimeStampedModel):
 
     @property
     def solved_challenges_as_percent(self):
-        l = self.challenges.count()
-        if l == 0: return 0
-        return int(float(self.solved_challenges.count() / l) * 100)
-
-    @property
-    def total_points(self):
-        return self.challenges.aggregate(Sum("points"))["points__sum"] or 0
-
-    @property
-    def scored_points(self):
-        return self.solved_challenges.aggregate(Sum("points"))["points__sum"] or 0
+        if self.challenge_count == 0: return 0
+        return int(float(self.solved_count / self.challenge_count) * 100)
 
     @property
     def scored_points_as_percent(self):
         if self.total_points == 0: return 0
         return int(float(self.scored_points / self.total_points) * 100)
 
+    COUNTER_FIELDS = ("challenge_count", "solved_count", "total_points", "scored_points")
+
+    def save(self, *args, **kwargs):
+        # the counters are only written through `update_counters`, never from a possibly stale instance
+        if not self._state.adding and "update_fields" not in kwargs:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def update_counters(cls, pk, challenge_count: int = 0, solved_count: int = 0, total_points: int = 0, scored_points: int = 0) -> None:
+        """Atomically add the given deltas to the progress counters of a CTF
+        """
+        cls.objects.filter(pk=pk).update(
+            challenge_count=F("challenge_count") + challenge_count,
+            solved_count=F("solved_count") + solved_count,
+            total_points=F("total_points") + total_points,
+            scored_points=F("scored_points") + scored_points,
+        )
+
+    @classmethod
+    def reconcile_counters(cls) -> int:
+        """Recompute the progress counters from the challenges, for the CTFs where they drifted
+
+        Returns:
+            int: the number of CTFs fixed
+        """
+        challenges = Challenge.objects.filter(ctf=OuterRef("pk")).order_by().values("ctf")
+        solved = challenges.filter(status="solved")
+        actual = {
+            "challenge_count": Coalesce(Subquery(challenges.annotate(count=Count("id")).values("count")), 0),
+            "solved_count": Coalesce(Subquery(solved.annotate(count=Count("id")).values("count")), 0),
+            "total_points": Coalesce(Subquery(challenges.annotate(points=Sum("points")).values("points")), 0),
+            "scored_points": Coalesce(Subquery(solved.annotate(points=Sum("points")).values("points")), 0),
+        }
+
+        drifted = cls.objects.annotate(
+            **{f"actual_{name}": value for name, value in actual.items()}
+        ).filter(
+            ~Q(challenge_count=F("actual_challenge_count")) |
+            ~Q(solved_count=F("actual_solved_count")) |
+            ~Q(total_points=F("actual_total_points")) |
+            ~Q(scored_points=F("actual_scored_points"))
+        ).values_list("pk", flat=True)
+
+        return cls.objects.filter(pk__in=list(drifted)).update(**actual)
+
     @property
     def duration(self):
         if self.is_permanent: return 0
@@ -182,81 +273,193 @@ class Ctf(TimeStampedModel):
     def ctftime_url(self):
         return f"{CTFTIME_URL}/event/{self.ctftime_id}"
 
+    def get_ctftime_logo_url(self, size="large") -> str:
+        # prefer the local thumbnail, then the CTFTime hosted logo until it gets mirrored
+        if self.ctftime_logo_thumbnail:
+            return f"{CTF_LOGO_URL}{self.ctftime_logo_thumbnail}-{CTF_LOGO_THUMBNAIL_SIZES[size]}.png"
+        if not self.ctftime_logo:
+            Ctf.resolve_ctftime_logos([self,])
+        return self.ctftime_logo or f"{STATIC_URL}images/{CTFPAD_DEFAULT_CTF_LOGO}"
+
     @cached_property
     def ctftime_logo_url(self):
-        return ctftime_get_ctf_logo_url(self.ctftime_id)
+        return self.get_ctftime_logo_url("large")
+
+    @cached_property
+    def ctftime_logo_small_url(self):
+        return self.get_ctftime_logo_url("small")
+
+    @classmethod
+    def resolve_ctftime_logos(cls, ctfs) -> None:
+        """Resolve in one batch the CTFTime logos not yet known for `ctfs`, and store them on the CTF rows
+        so that rendering never has to wait on CTFTime again for those CTFs.
+
+        Args:
+            ctfs (iterable): the Ctf objects about to be rendered
+        """
+        missing = [ctf for ctf in ctfs if ctf.ctftime_id and not ctf.ctftime_logo]
+        if not missing:
+            return
+
+        # recent events are already known from the local CTFTime mirror
+        ctftime_ids = {ctf.ctftime_id for ctf in missing}
+        logos = {
+            event_id: ctftime_parse_logo_url({"logo": logo})
+            for event_id, logo in CtftimeEvent.objects.filter(id__in=ctftime_ids).values_list("id", "logo")
+        }
+        logos |= ctftime_fetch_ctf_logo_urls(ctftime_ids - logos.keys())
+
+        resolved = []
+        for ctf in missing:
+            if ctf.ctftime_id in logos:
+                ctf.ctftime_logo = logos[ctf.ctftime_id]
+                resolved.append(ctf)
+        cls.objects.bulk_update(resolved, ["ctftime_logo"])
+
+    @classmethod
+    def mirror_ctftime_logos(cls, ctfs) -> int:
+        """Download the CTFTime logos of `ctfs` not mirrored yet, and store their local thumbnails.
+
+        Args:
+            ctfs (iterable): the Ctf objects to process
+
+        Returns:
+            int: the number of CTFs whose logo got mirrored
+        """
+        missing = [ctf for ctf in ctfs if ctf.ctftime_logo.startswith(("http://", "https://")) and not ctf.ctftime_logo_thumbnail]
+        if not missing:
+            return 0
+
+        logo_urls = {ctf.ctftime_logo for ctf in missing}
+        with ThreadPoolExecutor(max_workers=min(len(logo_urls), CTFTIME_MAX_CONCURRENT_REQUESTS)) as pool:
+            thumbnails = dict(zip(logo_urls, pool.map(mirror_ctf_logo, logo_urls)))
+
+        mirrored = []
+        for ctf in missing:
+            if thumbnails[ctf.ctftime_logo]:
+                ctf.ctftime_logo_thumbnail = thumbnails[ctf.ctftime_logo]
+                mirrored.append(ctf)
+        cls.objects.bulk_update(mirrored, ["ctftime_logo_thumbnail"])
+        return len(mirrored)
 
     @cached_property
     def jitsi_url(self):
         return f"{JITSI_URL}/{self.id}"
 
-    def team_timeline(self):
-        challs = self.challenge_set.prefetch_related(
-            'solvers__user'
+    @property
+    def timeline_cache_key(self) -> str:
+        return f"ctf:{self.pk}:timeline"
+
+    def team_timeline(self) -> list:
+        """Return the members who scored during the CTF, by order of first solve, each with their running score
+        (`challs`) after every solved challenge. Cached until the solves of the CTF change (see `CtfStats.changed`).
+        """
+        members = cache.get(self.timeline_cache_key)
+        if members is None:
+            members = self.compute_team_timeline()
+            cache.set(self.timeline_cache_key, members, STATS_CACHE_TIMEOUT)
+        return members
+
+    def compute_team_timeline(self) -> list:
+        Solve = Challenge.solvers.through
+        solver_count = Solve.objects.filter(
+            challenge=OuterRef('challenge')
+        ).values(
+            'challenge'
+        ).annotate(
+            count=Count('id')
+        ).values('count')
+
+        # one row per (challenge, solver), with the solver's running score: the points of a challenge are split between its solvers
+        solves = Solve.objects.select_related(
+            'challenge',
+            'member__user',
         ).filter(
-            status='solved',
-            solvers__isnull=False
+            challenge__ctf=self,
+            challenge__status='solved',
+        ).annotate(
+            running_points=Window(
+                Sum(Cast('challenge__points', models.FloatField()) / Subquery(solver_count)),
+                partition_by=F('member'),
+                order_by=[F('challenge__solved_time').asc(), F('challenge').asc()],
+            )
         ).order_by(
-            'solved_time'
-        ).distinct(
-            'solved_time',
-            'id'
-        ).all()
+            'challenge__solved_time',
+            'challenge',
+        )
 
-        members = []
-        for chall in challs:
-            for member in chall.solvers.all():
-                if member in members:
-                    continue
-                member.accu = 0
-                member.challs = OrderedDict()
-                members.append(member)
-
-        for chall in challs:
-            solvers = chall.solvers.all()
-            for member in members:
-                points = 0
-                if member in solvers:
-                    points = chall.points / len(solvers)
-                member.accu += points
+        challs = {}
+        members = {}
+        running_points = {}
+        for solve in solves:
+            challs.setdefault(solve.challenge_id, solve.challenge)
+            members.setdefault(solve.member_id, solve.member)
+            running_points[solve.member_id, solve.challenge_id] = solve.running_points
+
+        for member in members.values():
+            member.accu = 0
+            member.challs = OrderedDict()
+            for chall in challs.values():
+                member.accu = running_points.get((member.pk, chall.pk), member.accu)
                 member.challs[chall] = member.accu
 
-        return members
+        return list(members.values())
 
-    def export_notes_as_zipstream(self, stream, member=None):
-        zip_file = zipfile.ZipFile(stream, 'w')
+    @property
+    def notes_archive_name(self) -> str:
+        return f"{slugify(self.name)}-notes.zip"
+
+    def export_notes_as_zipstream(self, member=None):
+        """Generate the ZIP archive of the CTF and challenge notes, chunk by chunk, as the notes are retrieved.
+        Up to `HEDGEDOC_EXPORT_MAX_CONCURRENT_REQUESTS` notes are in flight at once over a single HedgeDoc session,
+        and an entry is emitted (and its note released) as soon as its note (and the ones before it) arrived.
+
+        Args:
+            member (Member): the requesting member, whose HedgeDoc privileges are used
+
+        Yields:
+            bytes: the next chunk of the ZIP archive
+        """
         now = datetime.now()
         ts = (now.year, now.month, now.day, 0, 0, 0)
 
-        session = requests.Session()
+        notes = [(f"{slugify(self.name)}.md", self.note_id)]
+        notes+= [(f"{slugify(f'{self.name}-{challenge.name}')}.md", challenge.note_id) for challenge in self.challenges]
+
+        # the local snapshots spare the download of the notes that did not change since they were synchronized
+        snapshots = NoteSnapshot.versions([note_id for _, note_id in notes])
+
+        stream = ZipStreamBuffer()
+        session = clients.hedgedoc.session()
 
         #
         # try impersonating requesting user on HedgeDoc, this way we're sure anonymous & unauthorized users
-        # can't dump data
+        # can't dump data: the snapshots too are only used once the member session can read the note
         #
         if member:
-            t = session.post(f"{HEDGEDOC_URL}/login", data={"email": member.hedgedoc_username, "password": member.hedgedoc_password})
-
-        # add ctf notes
-        fname = slugify( f"{self.name}.md")
-        with tempfile.TemporaryFile() as fp:
-            result = session.get(f"{HEDGEDOC_URL}{self.note_id}/download")
-            zip_file.writestr(zipfile.ZipInfo(filename=fname, date_time=ts), result.text)
-
-        # add challenge notes
-        for challenge in self.challenges:
-            fname = slugify( f"{self.name}-{challenge.name}.md" )
-            with tempfile.TemporaryFile() as fp:
-                result = session.get(f"{HEDGEDOC_URL}{challenge.note_id}/download")
-                if result.status_code != requests.codes.ok:
-                    continue
-                zinfo = zipfile.ZipInfo(filename=fname, date_time=ts)
-                zip_file.writestr(zinfo, result.text)
-
-        if member:
-            session.post(f"{HEDGEDOC_URL}/logout")
-
-        return f"{slugify(self.name)}-notes.zip"
+            hedgedoc_login(session, member)
+
+        try:
+            with zipfile.ZipFile(stream, 'w') as zip_file, \
+                 ThreadPoolExecutor(max_workers=HEDGEDOC_EXPORT_MAX_CONCURRENT_REQUESTS) as pool:
+                # notes are submitted lazily, so that only the ones in flight are ever held in memory
+                exports = (pool.submit(hedgedoc_export_note, session, note_id, snapshots) for _, note_id in notes)
+                in_flight = deque(itertools.islice(exports, HEDGEDOC_EXPORT_MAX_CONCURRENT_REQUESTS))
+                for fname, _ in notes:
+                    # the oldest export in flight is the one of this note, the next one takes its place
+                    text = in_flight.popleft().result()
+                    in_flight.extend(itertools.islice(exports, 1))
+                    if text is None:
+                        continue
+                    zip_file.writestr(zipfile.ZipInfo(filename=fname, date_time=ts), text, compress_type=zipfile.ZIP_DEFLATED)
+                    yield stream.pop()
+
+            # central directory
+            yield stream.pop()
+
+        finally:
+            if member:
+                hedgedoc_logout(session)
 
 
     @property
@@ -273,6 +476,33 @@ class Ctf(TimeStampedModel):
         return self.players.all()
 
 
+class MemberQuerySet(models.QuerySet):
+
+    def with_stats(self, year=None):
+        """Annotate the members with their public solves stats, computed by subqueries of the same query: `solve_count`,
+        `solved_points`, `last_solve_time` and `best_category_name` (the category they scored the most points in,
+        during `year` if set), which `is_active` and `best_category` then use instead of querying again.
+        """
+        solves = Challenge.objects.filter(
+            solvers=OuterRef('pk'),
+            ctf__visibility='public',
+        ).order_by()
+        per_member = solves.values('solvers')
+
+        best_category_solves = solves.filter(solved_time__year=year) if year else solves
+
+        return self.select_related(
+            'user',
+            'selected_ctf',
+        ).annotate(
+            solve_count=Coalesce(Subquery(per_member.annotate(count=Count('id')).values('count')), 0),
+            solved_points=Coalesce(Subquery(per_member.annotate(points=Sum('points')).values('points')), 0),
+            last_solve_time=Subquery(per_member.annotate(time=Max('solved_time')).values('time')),
+            best_category_name=Subquery(
+                best_category_solves.values('category__name').annotate(points=Sum('points')).order_by('-points').values('category__name')[:1]
+            ),
+            best_category_year=Value(year or 0),
+        )
 
 
 class Member(TimeStampedModel):
@@ -280,6 +510,7 @@ class Member(TimeStampedModel):
     CTF team member model
     """
     STATUS = Choices('member', 'guest', )
+    HEDGEDOC_STATUS = Choices('pending', 'provisioned', 'failed', )
     COUNTRIES= Choices("Afghanistan", "Alabama", "Alaska", "Albania", "Algeria", "American Samoa", "Andorra", "Angola", "Anguilla", "Antarctica", "Antigua and Barbuda", "Argentina", "Arizona", "Arkansas", "Armenia", "Aruba", "Australia", "Austria", "Azerbaijan", "Bahamas", "Bahrain", "Bangladesh", "Barbados", "Belarus", "Belgium", "Belize", "Benin", "Bermuda", "Bhutan", "Bolivia", "Bosnia and Herzegovina", "Botswana", "Bouvet Island", "Brazil", "British Indian Ocean Territory", "British Virgin Islands", "Brunei", "Bulgaria", "Burkina Faso", "Burundi", "California", "Cambodia", "Cameroon", "Canada", "Cape Verde", "Caribbean Netherlands", "Cayman Islands", "Central African Republic", "Chad", "Chile", "China", "Christmas Island", "Cocos (Keeling) Islands", "Colombia", "Colorado", "Comoros", "Connecticut", "Cook Islands", "Costa Rica", "Croatia", "Cuba", "Curaçao", "Cyprus", "Czechia", "Côte d\'Ivoire (Ivory Coast)", "DR Congo", "Delaware", "Denmark", "Djibouti", "Dominica", "Dominican Republic", "Ecuador", "Egypt", "El Salvador", "England", "Equatorial Guinea", "Eritrea", "Estonia", "Eswatini (Swaziland)", "Ethiopia", "European Union", "Falkland Islands", "Faroe Islands", "Fiji", "Finland", "Florida", "France", "French Guiana", "French Polynesia", "French Southern and Antarctic Lands", "Gabon", "Gambia", "Georgia", "Georgia", "Germany", "Ghana", "Gibraltar", "Greece", "Greenland", "Grenada", "Guadeloupe", "Guam", "Guatemala", "Guernsey", "Guinea", "Guinea-Bissau", "Guyana", "Haiti", "Hawaii", "Heard Island and McDonald Islands", "Honduras", "Hong Kong", "Hungary", "Iceland", "Idaho", "Illinois", "India", "Indiana", "Indonesia", "Iowa", "Iran", "Iraq", "Ireland", "Isle of Man", "Israel", "Italy", "Jamaica", "Japan", "Jersey", "Jordan", "Kansas", "Kazakhstan", "Kentucky", "Kenya", "Kiribati", "Kosovo", "Kuwait", "Kyrgyzstan", "Laos", "Latvia", "Lebanon", "Lesotho", "Liberia", "Libya", "Liechtenstein", "Lithuania", "Louisiana", "Luxembourg", "Macau", "Madagascar", "Maine", "Malawi", "Malaysia", "Maldives", "Mali", "Malta", "Marshall Islands", "Martinique", "Maryland", "Massachusetts", "Mauritania", "Mauritius", "Mayotte", "Mexico", "Michigan", "Micronesia", "Minnesota", "Mississippi", "Missouri", "Moldova", "Monaco", "Mongolia", "Montana", "Montenegro", "Montserrat", "Morocco", "Mozambique", "Myanmar", "Namibia", "Nauru", "Nebraska", "Nepal", "Netherlands", "Nevada", "New Caledonia", "New Hampshire", "New Jersey", "New Mexico", "New York", "New Zealand", "Nicaragua", "Niger", "Nigeria", "Niue", "Norfolk Island", "North Carolina", "North Dakota", "North Korea", "North Macedonia", "Northern Ireland", "Northern Mariana Islands", "Norway", "Ohio", "Oklahoma", "Oman", "Oregon", "Pakistan", "Palau", "Palestine", "Panama", "Papua New Guinea", "Paraguay", "Pennsylvania", "Peru", "Philippines", "Pitcairn Islands", "Poland", "Portugal", "Puerto Rico", "Qatar", "Republic of the Congo", "Rhode Island", "Romania", "Russia", "Rwanda", "Réunion", "Saint Barthélemy", "Saint Helena, Ascension and Tristan da Cunha", "Saint Kitts and Nevis", "Saint Lucia", "Saint Martin", "Saint Pierre and Miquelon", "Saint Vincent and the Grenadines", "Samoa", "San Marino", "Saudi Arabia", "Scotland", "Senegal", "Serbia", "Seychelles", "Sierra Leone", "Singapore", "Sint Maarten", "Slovakia", "Slovenia", "Solomon Islands", "Somalia", "South Africa", "South Carolina", "South Dakota", "South Georgia", "South Korea", "South Sudan", "Spain", "Sri Lanka", "Sudan", "Suriname", "Svalbard and Jan Mayen", "Sweden", "Switzerland", "Syria", "São Tomé and Príncipe", "Taiwan", "Tajikistan", "Tanzania", "Tennessee", "Texas", "Thailand", "Timor-Leste", "Togo", "Tokelau", "Tonga", "Trinidad and Tobago", "Tunisia", "Turkey", "Turkmenistan", "Turks and Caicos Islands", "Tuvalu", "Uganda", "Ukraine", "United Arab Emirates", "United Kingdom", "United Nations", "United States", "United States Minor Outlying Islands", "United States Virgin Islands", "Uruguay", "Utah", "Uzbekistan", "Vanuatu", "Vatican City (Holy See)", "Venezuela", "Vermont", "Vietnam", "Virginia", "Wales", "Wallis and Futuna", "Washington", "West Virginia", "Western Sahara", "Wisconsin", "Wyoming", "Yemen", "Zambia", "Zimbabwe")
     # pytz.common_timezones
     TIMEZONES = Choices('UTC', 'Africa/Abidjan', 'Africa/Accra', 'Africa/Addis_Ababa', 'Africa/Algiers', 'Africa/Asmara', 'Africa/Bamako', 'Africa/Bangui', 'Africa/Banjul', 'Africa/Bissau', 'Africa/Blantyre', 'Africa/Brazzaville', 'Africa/Bujumbura', 'Africa/Cairo', 'Africa/Casablanca', 'Africa/Ceuta', 'Africa/Conakry', 'Africa/Dakar', 'Africa/Dar_es_Salaam', 'Africa/Djibouti', 'Africa/Douala', 'Africa/El_Aaiun', 'Africa/Freetown', 'Africa/Gaborone', 'Africa/Harare', 'Africa/Johannesburg', 'Africa/Juba', 'Africa/Kampala', 'Africa/Khartoum', 'Africa/Kigali', 'Africa/Kinshasa', 'Africa/Lagos', 'Africa/Libreville', 'Africa/Lome', 'Africa/Luanda', 'Africa/Lubumbashi', 'Africa/Lusaka', 'Africa/Malabo', 'Africa/Maputo', 'Africa/Maseru', 'Africa/Mbabane', 'Africa/Mogadishu', 'Africa/Monrovia', 'Africa/Nairobi', 'Africa/Ndjamena', 'Africa/Niamey', 'Africa/Nouakchott', 'Africa/Ouagadougou', 'Africa/Porto-Novo', 'Africa/Sao_Tome', 'Africa/Tripoli', 'Africa/Tunis', 'Africa/Windhoek', 'America/Adak', 'America/Anchorage', 'America/Anguilla', 'America/Antigua', 'America/Araguaina', 'America/Argentina/Buenos_Aires', 'America/Argentina/Catamarca', 'America/Argentina/Cordoba', 'America/Argentina/Jujuy', 'America/Argentina/La_Rioja', 'America/Argentina/Mendoza', 'America/Argentina/Rio_Gallegos', 'America/Argentina/Salta', 'America/Argentina/San_Juan', 'America/Argentina/San_Luis', 'America/Argentina/Tucuman', 'America/Argentina/Ushuaia', 'America/Aruba', 'America/Asuncion', 'America/Atikokan', 'America/Bahia', 'America/Bahia_Banderas', 'America/Barbados', 'America/Belem', 'America/Belize', 'America/Blanc-Sablon', 'America/Boa_Vista', 'America/Bogota', 'America/Boise', 'America/Cambridge_Bay', 'America/Campo_Grande', 'America/Cancun', 'America/Caracas', 'America/Cayenne', 'America/Cayman', 'America/Chicago', 'America/Chihuahua', 'America/Costa_Rica', 'America/Creston', 'America/Cuiaba', 'America/Curacao', 'America/Danmarkshavn', 'America/Dawson', 'America/Dawson_Creek', 'America/Denver', 'America/Detroit', 'America/Dominica', 'America/Edmonton', 'America/Eirunepe', 'America/El_Salvador', 'America/Fort_Nelson', 'America/Fortaleza', 'America/Glace_Bay', 'America/Goose_Bay', 'America/Grand_Turk', 'America/Grenada', 'America/Guadeloupe', 'America/Guatemala', 'America/Guayaquil', 'America/Guyana', 'America/Halifax', 'America/Havana', 'America/Hermosillo', 'America/Indiana/Indianapolis', 'America/Indiana/Knox', 'America/Indiana/Marengo', 'America/Indiana/Petersburg', 'America/Indiana/Tell_City', 'America/Indiana/Vevay', 'America/Indiana/Vincennes', 'America/Indiana/Winamac', 'America/Inuvik', 'America/Iqaluit', 'America/Jamaica', 'America/Juneau', 'America/Kentucky/Louisville', 'America/Kentucky/Monticello', 'America/Kralendijk', 'America/La_Paz', 'America/Lima', 'America/Los_Angeles', 'America/Lower_Princes', 'America/Maceio', 'America/Managua', 'America/Manaus', 'America/Marigot', 'America/Martinique', 'America/Matamoros', 'America/Mazatlan', 'America/Menominee', 'America/Merida', 'America/Metlakatla', 'America/Mexico_City', 'America/Miquelon', 'America/Moncton', 'America/Monterrey', 'America/Montevideo', 'America/Montserrat', 'America/Nassau', 'America/New_York', 'America/Nipigon', 'America/Nome', 'America/Noronha', 'America/North_Dakota/Beulah', 'America/North_Dakota/Center', 'America/North_Dakota/New_Salem', 'America/Nuuk', 'America/Ojinaga', 'America/Panama', 'America/Pangnirtung', 'America/Paramaribo', 'America/Phoenix', 'America/Port-au-Prince', 'America/Port_of_Spain', 'America/Porto_Velho', 'America/Puerto_Rico', 'America/Punta_Arenas', 'America/Rainy_River', 'America/Rankin_Inlet', 'America/Recife', 'America/Regina', 'America/Resolute', 'America/Rio_Branco', 'America/Santarem', 'America/Santiago', 'America/Santo_Domingo', 'America/Sao_Paulo', 'America/Scoresbysund', 'America/Sitka', 'America/St_Barthelemy', 'America/St_Johns', 'America/St_Kitts', 'America/St_Lucia', 'America/St_Thomas', 'America/St_Vincent', 'America/Swift_Current', 'America/Tegucigalpa', 'America/Thule', 'America/Thunder_Bay', 'America/Tijuana', 'America/Toronto', 'America/Tortola', 'America/Vancouver', 'America/Whitehorse', 'America/Winnipeg', 'America/Yakutat', 'America/Yellowknife', 'Antarctica/Casey', 'Antarctica/Davis', 'Antarctica/DumontDUrville', 'Antarctica/Macquarie', 'Antarctica/Mawson', 'Antarctica/McMurdo', 'Antarctica/Palmer', 'Antarctica/Rothera', 'Antarctica/Syowa', 'Antarctica/Troll', 'Antarctica/Vostok', 'Arctic/Longyearbyen', 'Asia/Aden', 'Asia/Almaty', 'Asia/Amman', 'Asia/Anadyr', 'Asia/Aqtau', 'Asia/Aqtobe', 'Asia/Ashgabat', 'Asia/Atyrau', 'Asia/Baghdad', 'Asia/Bahrain', 'Asia/Baku', 'Asia/Bangkok', 'Asia/Barnaul', 'Asia/Beirut', 'Asia/Bishkek', 'Asia/Brunei', 'Asia/Chita', 'Asia/Choibalsan', 'Asia/Colombo', 'Asia/Damascus', 'Asia/Dhaka', 'Asia/Dili', 'Asia/Dubai', 'Asia/Dushanbe', 'Asia/Famagusta', 'Asia/Gaza', 'Asia/Hebron', 'Asia/Ho_Chi_Minh', 'Asia/Hong_Kong', 'Asia/Hovd', 'Asia/Irkutsk', 'Asia/Jakarta', 'Asia/Jayapura', 'Asia/Jerusalem', 'Asia/Kabul', 'Asia/Kamchatka', 'Asia/Karachi', 'Asia/Kathmandu', 'Asia/Khandyga', 'Asia/Kolkata', 'Asia/Krasnoyarsk', 'Asia/Kuala_Lumpur', 'Asia/Kuching', 'Asia/Kuwait', 'Asia/Macau', 'Asia/Magadan', 'Asia/Makassar', 'Asia/Manila', 'Asia/Muscat', 'Asia/Nicosia', 'Asia/Novokuznetsk', 'Asia/Novosibirsk', 'Asia/Omsk', 'Asia/Oral', 'Asia/Phnom_Penh', 'Asia/Pontianak', 'Asia/Pyongyang', 'Asia/Qatar', 'Asia/Qostanay', 'Asia/Qyzylorda', 'Asia/Riyadh', 'Asia/Sakhalin', 'Asia/Samarkand', 'Asia/Seoul', 'Asia/Shanghai', 'Asia/Singapore', 'Asia/Srednekolymsk', 'Asia/Taipei', 'Asia/Tashkent', 'Asia/Tbilisi', 'Asia/Tehran', 'Asia/Thimphu', 'Asia/Tokyo', 'Asia/Tomsk', 'Asia/Ulaanbaatar', 'Asia/Urumqi', 'Asia/Ust-Nera', 'Asia/Vientiane', 'Asia/Vladivostok', 'Asia/Yakutsk', 'Asia/Yangon', 'Asia/Yekaterinburg', 'Asia/Yerevan', 'Atlantic/Azores', 'Atlantic/Bermuda', 'Atlantic/Canary', 'Atlantic/Cape_Verde', 'Atlantic/Faroe', 'Atlantic/Madeira', 'Atlantic/Reykjavik', 'Atlantic/South_Georgia', 'Atlantic/St_Helena', 'Atlantic/Stanley', 'Australia/Adelaide', 'Australia/Brisbane', 'Australia/Broken_Hill', 'Australia/Darwin', 'Australia/Eucla', 'Australia/Hobart', 'Australia/Lindeman', 'Australia/Lord_Howe', 'Australia/Melbourne', 'Australia/Perth', 'Australia/Sydney', 'Canada/Atlantic', 'Canada/Central', 'Canada/Eastern', 'Canada/Mountain', 'Canada/Newfoundland', 'Canada/Pacific', 'Europe/Amsterdam', 'Europe/Andorra', 'Europe/Astrakhan', 'Europe/Athens', 'Europe/Belgrade', 'Europe/Berlin', 'Europe/Bratislava', 'Europe/Brussels', 'Europe/Bucharest', 'Europe/Budapest', 'Europe/Busingen', 'Europe/Chisinau', 'Europe/Copenhagen', 'Europe/Dublin', 'Europe/Gibraltar', 'Europe/Guernsey', 'Europe/Helsinki', 'Europe/Isle_of_Man', 'Europe/Istanbul', 'Europe/Jersey', 'Europe/Kaliningrad', 'Europe/Kiev', 'Europe/Kirov', 'Europe/Lisbon', 'Europe/Ljubljana', 'Europe/London', 'Europe/Luxembourg', 'Europe/Madrid', 'Europe/Malta', 'Europe/Mariehamn', 'Europe/Minsk', 'Europe/Monaco', 'Europe/Moscow', 'Europe/Oslo', 'Europe/Paris', 'Europe/Podgorica', 'Europe/Prague', 'Europe/Riga', 'Europe/Rome', 'Europe/Samara', 'Europe/San_Marino', 'Europe/Sarajevo', 'Europe/Saratov', 'Europe/Simferopol', 'Europe/Skopje', 'Europe/Sofia', 'Europe/Stockholm', 'Europe/Tallinn', 'Europe/Tirane', 'Europe/Ulyanovsk', 'Europe/Uzhgorod', 'Europe/Vaduz', 'Europe/Vatican', 'Europe/Vienna', 'Europe/Vilnius', 'Europe/Volgograd', 'Europe/Warsaw', 'Europe/Zagreb', 'Europe/Zaporozhye', 'Europe/Zurich', 'GMT', 'Indian/Antananarivo', 'Indian/Chagos', 'Indian/Christmas', 'Indian/Cocos', 'Indian/Comoro', 'Indian/Kerguelen', 'Indian/Mahe', 'Indian/Maldives', 'Indian/Mauritius', 'Indian/Mayotte', 'Indian/Reunion', 'Pacific/Apia', 'Pacific/Auckland', 'Pacific/Bougainville', 'Pacific/Chatham', 'Pacific/Chuuk', 'Pacific/Easter', 'Pacific/Efate', 'Pacific/Enderbury', 'Pacific/Fakaofo', 'Pacific/Fiji', 'Pacific/Funafuti', 'Pacific/Galapagos', 'Pacific/Gambier', 'Pacific/Guadalcanal', 'Pacific/Guam', 'Pacific/Honolulu', 'Pacific/Kiritimati', 'Pacific/Kosrae', 'Pacific/Kwajalein', 'Pacific/Majuro', 'Pacific/Marquesas', 'Pacific/Midway', 'Pacific/Nauru', 'Pacific/Niue', 'Pacific/Norfolk', 'Pacific/Noumea', 'Pacific/Pago_Pago', 'Pacific/Palau', 'Pacific/Pitcairn', 'Pacific/Pohnpei', 'Pacific/Port_Moresby', 'Pacific/Rarotonga', 'Pacific/Saipan', 'Pacific/Tahiti', 'Pacific/Tarawa', 'Pacific/Tongatapu', 'Pacific/Wake', 'Pacific/Wallis', 'US/Alaska', 'US/Arizona', 'US/Central', 'US/Eastern', 'US/Hawaii', 'US/Mountain', 'US/Pacific')
@@ -295,11 +526,30 @@ class Member(TimeStampedModel):
     last_active_notification = models.DateTimeField(null=True)
     joined_time = models.DateTimeField(null=True)
     hedgedoc_password = models.CharField(max_length=64, null=True)
+    hedgedoc_status = StatusField(choices_name='HEDGEDOC_STATUS')
     twitter_url = models.URLField(blank=True)
     github_url = models.URLField(blank=True)
     blog_url = models.URLField(blank=True)
     selected_ctf = models.ForeignKey(Ctf, on_delete=models.SET_NULL, null=True, blank=True, related_name="players", related_query_name="player")
     status = StatusField()
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = MemberQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"]),
+        ]
+
+    @classmethod
+    def refresh_search_vector(cls, **filters) -> int:
+        """Recompute the full-text search document (username & email, then description) of the matching members
+        """
+        user = User.objects.filter(pk=OuterRef("user_id"))
+        return cls.objects.filter(**filters).update(
+            search_vector=SearchVector(Subquery(user.values("username")), Subquery(user.values("email")), weight="A", config=SEARCH_CONFIG) +
+                          SearchVector("description", weight="B", config=SEARCH_CONFIG)
+        )
 
     @property
     def username(self):
@@ -321,12 +571,16 @@ class Member(TimeStampedModel):
         if self.status == "guest":
             return True
 
-        last = self.last_solved_challenge
-        if not last:
+        if "last_solve_time" in self.__dict__:
+            last_solve_time = self.last_solve_time
+        else:
+            last = self.last_solved_challenge
+            last_solve_time = last.solved_time if last else None
+        if not last_solve_time:
             return False
 
         now = datetime.now()
-        return last.solved_time - now < timedelta(days=365)
+        return last_solve_time - now < timedelta(days=365)
 
     @cached_property
     def solved_public_challenges(self):
@@ -334,6 +588,39 @@ class Member(TimeStampedModel):
             ctf__visibility = "public"
         ).order_by("solved_time")
 
+    def cumulative_score(self, max_points: int = None) -> list:
+        """Return the running total of the points of the solved public challenges, as (time, accu) pairs in solve order
+
+        Args:
+            max_points (int): if set, only about that many evenly spaced pairs are returned, the last one always included
+
+        Returns:
+            list: the (time, accu) named tuples
+        """
+        solve_order = [F('solved_time').asc(), F('id').asc()]
+        qs = self.solved_public_challenges.annotate(
+            time=F('solved_time'),
+            accu=Window(Sum('points'), order_by=solve_order),
+        )
+
+        if max_points:
+            # keep the rows where `max_points * rank / total` reaches a new integer
+            qs = qs.annotate(
+                rank=Window(RowNumber(), order_by=solve_order),
+                total=Window(Count('id')),
+            ).annotate(
+                bucket=F('rank') * max_points / F('total'),
+                previous_bucket=(F('rank') - 1) * max_points / F('total'),
+            ).filter(
+                bucket__gt=F('previous_bucket')
+            )
+
+        return list(qs.values_list('time', 'accu', named=True))
+
+    @cached_property
+    def score_graph(self) -> list:
+        return self.cumulative_score(SCORE_GRAPH_MAX_POINTS)
+
     @cached_property
     def solved_categories(self):
         return self.solved_public_challenges.values(
@@ -364,15 +651,22 @@ class Member(TimeStampedModel):
         )
         return url
 
-    def save(self):
-        if not self.hedgedoc_password:
-            # create the hedgedoc user
-            self.hedgedoc_password = get_random_string(64)
-            if not register_new_hedgedoc_user(self.hedgedoc_username, self.hedgedoc_password):
-                # password empty == anonymous mode under HedgeDoc
-                self.hedgedoc_password = ""
-
-        super(Member, self).save()
+    HEDGEDOC_FIELDS = ("hedgedoc_password", "hedgedoc_status")
+
+    def save(self, *args, **kwargs):
+        # the hedgedoc account is only written on creation, by the provisioning worker or when explicitly
+        # listed in `update_fields`, never from a possibly stale instance
+        if not self._state.adding and "update_fields" not in kwargs:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.HEDGEDOC_FIELDS
+            ]
+        update_fields = kwargs.get("update_fields")
+        super(Member, self).save(*args, **kwargs)
+
+        if self.hedgedoc_status == "pending" and (update_fields is None or "hedgedoc_status" in update_fields):
+            # the hedgedoc user is created in the background by the `provision_hedgedoc_users` worker
+            HedgedocProvisioningJob.objects.get_or_create(member=self)
         return
 
     @property
@@ -409,6 +703,9 @@ class Member(TimeStampedModel):
         return reverse('ctfpad:users-detail', args=[str(self.id), ])
 
     def best_category(self, year=None):
+        if getattr(self, "best_category_year", None) == (year or 0):
+            return self.best_category_name or ""
+
         qs = self.solved_public_challenges.values(
             "category__name"
         ).annotate(
@@ -427,6 +724,84 @@ class Member(TimeStampedModel):
 
         return qs.first()["category__name"]
 
+class HedgedocProvisioningJob(TimeStampedModel):
+    """
+    Durable queue entry for the creation of the HedgeDoc account of a member. Until it succeeds, the
+    member stays in anonymous mode under HedgeDoc (i.e. with an empty password).
+    """
+    member = models.OneToOneField(Member, on_delete=models.CASCADE, related_name="hedgedoc_provisioning_job")
+    password = models.CharField(max_length=64, default=get_random_string_64)
+    attempts = models.IntegerField(default=0)
+    next_attempt_time = models.DateTimeField(default=datetime.now, db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.member} (attempt #{self.attempts + 1})"
+
+    def run(self) -> bool:
+        """Try to register the member in HedgeDoc. On failure the job is retried later with an
+        exponential backoff, until `HEDGEDOC_PROVISIONING_MAX_ATTEMPTS` is reached and the member is
+        marked as failed.
+
+        Returns:
+            bool: True if the member was provisioned
+        """
+        member = self.member
+        if register_new_hedgedoc_user(member.hedgedoc_username, self.password):
+            Member.objects.filter(pk=member.pk).update(hedgedoc_password=self.password, hedgedoc_status="provisioned")
+            self.delete()
+            return True
+
+        self.attempts += 1
+        if self.attempts >= HEDGEDOC_PROVISIONING_MAX_ATTEMPTS:
+            # password empty == anonymous mode under HedgeDoc
+            Member.objects.filter(pk=member.pk).update(hedgedoc_password="", hedgedoc_status="failed")
+            self.delete()
+            return False
+
+        self.next_attempt_time = datetime.now() + timedelta(seconds=HEDGEDOC_PROVISIONING_RETRY_DELAY * 2 ** (self.attempts - 1))
+        HedgedocProvisioningJob.objects.filter(pk=self.pk).update(attempts=self.attempts, next_attempt_time=self.next_attempt_time)
+        return False
+
+    @classmethod
+    def claim_due(cls, limit: int = 50) -> list:
+        """Claim the jobs whose next attempt is due, by pushing their next attempt time past
+        `HEDGEDOC_PROVISIONING_CLAIM_TIMEOUT`. Jobs locked by another worker are skipped.
+
+        Returns:
+            list: the claimed jobs
+        """
+        now = datetime.now()
+        with transaction.atomic():
+            jobs = list(
+                cls.objects.select_for_update(
+                    skip_locked=True, of=("self",)
+                ).select_related(
+                    "member__user"
+                ).filter(
+                    next_attempt_time__lte=now
+                ).order_by(
+                    "next_attempt_time"
+                )[:limit]
+            )
+            cls.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                next_attempt_time=now + timedelta(seconds=HEDGEDOC_PROVISIONING_CLAIM_TIMEOUT)
+            )
+        return jobs
+
+    @classmethod
+    def run_due(cls, limit: int = 50) -> int:
+        """Process the jobs whose next attempt is due. The jobs are claimed first, so that HedgeDoc is
+        called outside of any transaction.
+
+        Returns:
+            int: the number of processed jobs
+        """
+        jobs = cls.claim_due(limit)
+        for job in jobs:
+            job.run()
+        return len(jobs)
+
+
 class ChallengeCategory(TimeStampedModel):
     """
     CTF challenge category model
@@ -441,6 +816,9 @@ class ChallengeCategory(TimeStampedModel):
 
     class Meta:
         verbose_name_plural = "Categories"
+        indexes = [
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="ctfpad_category_name_trgm"),
+        ]
 
 
 class Challenge(TimeStampedModel):
@@ -461,11 +839,26 @@ class Challenge(TimeStampedModel):
     last_update_by = models.ForeignKey(Member, on_delete=models.DO_NOTHING, null=True, related_name='last_updater')
     flag = models.CharField(max_length=128, blank=True)
     flag_tracker = FieldTracker(fields=['flag',])
+    stats_tracker = FieldTracker(fields=['points', 'category', 'status', 'ctf',])
     status = StatusField()
     solved_time = MonitorField(monitor='status', when=['solved',])
     solvers = models.ManyToManyField("ctfpad.Member", blank=True, related_name="solved_challenges")
     tags = models.ManyToManyField("ctfpad.Tag", blank=True, related_name="challenges")
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"]),
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="ctfpad_challenge_name_trgm"),
+        ]
 
+    @classmethod
+    def refresh_search_vector(cls, **filters) -> int:
+        """Recompute the full-text search document (name, then description) of the matching challenges
+        """
+        return cls.objects.filter(**filters).update(
+            search_vector=SearchVector("name", weight="A", config=SEARCH_CONFIG) + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+        )
 
     @property
     def solved(self) -> bool:
@@ -551,10 +944,375 @@ class Tag(TimeStampedModel):
     """
     name = models.TextField(unique=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="ctfpad_tag_name_trgm"),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class CtftimeEvent(TimeStampedModel):
+    """
+    Local mirror of a CTFTime event, so that pages never wait on ctftime.org. The table is
+    refreshed in the background by the `sync_ctftime` management command.
+    """
+    id = models.IntegerField(primary_key=True)
+    title = models.CharField(max_length=256)
+    description = models.TextField(blank=True)
+    url = models.URLField(max_length=512, blank=True)
+    logo = models.URLField(max_length=512, blank=True)
+    weight = models.FloatField(default=0.0)
+    start = models.DateTimeField(db_index=True)
+    finish = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["start"]
+
+    def __str__(self) -> str:
+        return self.title
+
+    @property
+    def duration(self):
+        return self.finish - self.start
+
+    @classmethod
+    def current_and_future(cls, running=True, future=True):
+        """Return the mirrored CTFs that are currently running and/or starting later.
+
+        Returns:
+            QuerySet: matching CTFTime events, ordered by start date
+        """
+        now = datetime.now()
+        q = Q()
+        if running:
+            q |= Q(start__lt=now, finish__gt=now)
+        if future:
+            q |= Q(start__gt=now, finish__gt=now)
+        if not q:
+            return cls.objects.none()
+        return cls.objects.filter(q)
+
+    @classmethod
+    def sync(cls) -> int:
+        """Upsert the CTFTime events of the (-60 days/+26 weeks) window, and drop the ones that
+        fell out of it.
+
+        Returns:
+            int: the number of events received from CTFTime
+        """
+        events = [
+            cls(
+                id=ctf["id"],
+                title=ctf["title"],
+                description=ctf.get("description") or "",
+                url=ctf.get("url") or "",
+                logo=ctf.get("logo") or "",
+                weight=ctf.get("weight") or 0.0,
+                start=ctf["start"],
+                finish=ctf["finish"],
+            ) for ctf in ctftime_fetch_ctfs()
+        ]
+
+        cls.objects.bulk_create(
+            events,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=["title", "description", "url", "logo", "weight", "start", "finish", "last_modification_time"],
+        )
+        cls.objects.filter(finish__lt=datetime.now() - timedelta(days=60)).delete()
+        SearchCache.invalidate()
+        return len(events)
+
+
+class NoteSnapshot(TimeStampedModel):
+    """
+    Local copy of the body of a HedgeDoc note (of a CTF or a challenge), so that exports don't need to
+    download notes from HedgeDoc. The table is refreshed in the background by the `sync_note_snapshots`
+    management command.
+    """
+    note_id = models.CharField(max_length=38, unique=True)
+    body = models.TextField(blank=True)
+    checksum = models.CharField(max_length=64) # sha256 -> 32*2
+    note_update_time = models.DateTimeField(null=True)
+    last_sync_time = models.DateTimeField(null=True, db_index=True)
+    search_vector = SearchVectorField(null=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"]),
+        ]
+
+    def __str__(self) -> str:
+        return self.note_id
+
+    @classmethod
+    def versions(cls, note_ids: list) -> dict:
+        """
+        Returns:
+            dict: the (HedgeDoc update time, body) of the local copy of the notes indexed by note ID, for the notes
+            that have a snapshot
+        """
+        return {
+            note_id: (note_update_time, body)
+            for note_id, note_update_time, body in cls.objects.filter(
+                note_id__in=note_ids
+            ).values_list(
+                "note_id", "note_update_time", "body"
+            )
+        }
+
+    @classmethod
+    def sync(cls, member=None) -> int:
+        """Refresh the snapshots of the notes that changed since they were last synchronized. Only the
+        note information is fetched for every note, bodies are downloaded when their update time changed.
+        Notes of CTFs that ended more than `NOTE_SNAPSHOT_FREEZE_DELAY` days before their last sync are
+        not checked anymore.
+
+        Args:
+            member (Member): the member impersonated on HedgeDoc
+
+        Returns:
+            int: the number of snapshots created or updated
+        """
+        now = datetime.now()
+        freeze_delay = timedelta(days=NOTE_SNAPSHOT_FREEZE_DELAY)
+        snapshots = {
+            snapshot.note_id: snapshot
+            for snapshot in cls.objects.only("pk", "note_id", "note_update_time", "last_sync_time")
+        }
+
+        note_ids = set()
+        for note_id, end_date in itertools.chain(
+            Ctf.objects.exclude(note_id="").values_list("note_id", "end_date"),
+            Challenge.objects.exclude(note_id="").values_list("note_id", "ctf__end_date"),
+        ):
+            snapshot = snapshots.get(note_id)
+            if snapshot and snapshot.last_sync_time and end_date and end_date + freeze_delay < snapshot.last_sync_time:
+                continue
+            note_ids.add(note_id)
+
+        if not note_ids:
+            return 0
+
+        with clients.hedgedoc.session() as session:
+            if member:
+                hedgedoc_login(session, member)
+
+            def refresh(note_id: str):
+                info = hedgedoc_get_note_info(session, note_id)
+                if not info:
+                    return None
+                snapshot = snapshots.get(note_id)
+                if snapshot and snapshot.note_update_time == info["updatetime"]:
+                    return snapshot
+                body = hedgedoc_download_note(session, note_id)
+                if body is None:
+                    return None
+                return cls(
+                    note_id=note_id,
+                    body=body,
+                    checksum=hashlib.sha256(body.encode()).hexdigest(),
+                    note_update_time=info["updatetime"],
+                )
+
+            with ThreadPoolExecutor(max_workers=HEDGEDOC_SYNC_MAX_CONCURRENT_REQUESTS) as pool:
+                results = [result for result in pool.map(refresh, note_ids) if result is not None]
+
+            if member:
+                hedgedoc_logout(session)
+
+        unchanged = [snapshot.note_id for snapshot in results if snapshot.pk]
+        changed = [snapshot for snapshot in results if not snapshot.pk]
+        for snapshot in changed:
+            snapshot.last_sync_time = now
+
+        cls.objects.filter(note_id__in=unchanged).update(last_sync_time=now)
+        cls.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=["note_id"],
+            update_fields=["body", "checksum", "note_update_time", "last_sync_time", "last_modification_time"],
+        )
+        cls.objects.filter(note_id__in=[snapshot.note_id for snapshot in changed]).update(
+            search_vector=SearchVector("body", config=SEARCH_CONFIG)
+        )
+        if changed:
+            SearchCache.invalidate()
+        return len(changed)
+
+
+# the state of a challenge the aggregate tables depend on
+ChallengeSolves = namedtuple("ChallengeSolves", "ctf_id year category_id points solvers")
+
+
+class MemberCtfScore(TimeStampedModel):
+    """
+    Points scored by a member during a CTF, every challenge's points being split evenly between its solvers.
+    Maintained from the challenge signals (see `CtfStats.update_challenge`).
+    """
+    ctf = models.ForeignKey(Ctf, on_delete=models.CASCADE, related_name="member_scores")
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name="ctf_scores")
+    points = models.FloatField(default=0.0)
+    solve_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ctf", "member"], name="ctfpad_memberctfscore_unique"),
+        ]
+
+    @classmethod
+    def refresh(cls, ctf_ids: list) -> set:
+        """Recompute the scores of every member in the given CTFs
+
+        Returns:
+            set: the IDs of the members whose scores were updated or removed
+        """
+        rows = Challenge.solvers.through.objects.filter(
+            challenge__ctf__in=ctf_ids
+        ).values_list(
+            "challenge__ctf", "challenge", "member", "challenge__points"
+        )
+
+        rows = list(rows)
+        solver_counts = Counter(challenge_id for _, challenge_id, _, _ in rows)
+        scores = {}
+        for ctf_id, challenge_id, member_id, points in rows:
+            score = scores.setdefault((ctf_id, member_id), cls(ctf_id=ctf_id, member_id=member_id))
+            score.points += points / solver_counts[challenge_id]
+            score.solve_count += 1
+
+        stale = cls.objects.filter(ctf__in=ctf_ids)
+        member_ids = set(stale.values_list("member", flat=True)) | {member_id for _, member_id in scores}
+        stale.delete()
+        cls.objects.bulk_create(scores.values())
+        return member_ids
+
+    @classmethod
+    def add(cls, ctf_id, deltas: dict) -> tuple:
+        """Add (points, solve count) deltas, indexed by member ID, to the scores of the members in a CTF. The scores
+        left without any solve are removed.
+
+        Returns:
+            tuple: the set of IDs of the members who got their first solve in the CTF, and the one of the members
+            who lost their last solve
+        """
+        gaining = [member_id for member_id, (_, solves) in deltas.items() if solves > 0]
+        cls.objects.bulk_create([cls(ctf_id=ctf_id, member_id=member_id) for member_id in gaining], ignore_conflicts=True)
+
+        groups = {}
+        for member_id, delta in deltas.items():
+            if delta != (0, 0):
+                groups.setdefault(delta, []).append(member_id)
+        for (points, solves), member_ids in groups.items():
+            cls.objects.filter(ctf_id=ctf_id, member__in=member_ids).update(
+                points=F("points") + points,
+                solve_count=F("solve_count") + solves,
+            )
+
+        started, stopped = set(), set()
+        moved = [member_id for member_id, (_, solves) in deltas.items() if solves]
+        for member_id, solve_count in cls.objects.filter(ctf_id=ctf_id, member__in=moved).values_list("member", "solve_count"):
+            if solve_count <= 0:
+                stopped.add(member_id)
+            elif solve_count == deltas[member_id][1]:
+                started.add(member_id)
+        if stopped:
+            cls.objects.filter(ctf_id=ctf_id, member__in=stopped).delete()
+        return started, stopped
+
+
+class MemberYearStats(TimeStampedModel):
+    """
+    Number of CTFs a member played (i.e. solved at least one challenge of) per year
+    """
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name="year_stats")
+    year = models.IntegerField()
+    play_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["member", "year"], name="ctfpad_memberyearstats_unique"),
+        ]
+
+    @classmethod
+    def refresh(cls, member_ids: list) -> None:
+        """Recompute the yearly activity of the given members from their CTF scores
+        """
+        rows = MemberCtfScore.objects.filter(
+            member__in=member_ids,
+            ctf__start_date__isnull=False,
+        ).values(
+            "member", year=ExtractYear("ctf__start_date")
+        ).annotate(
+            play_count=Count("ctf")
+        )
+
+        cls.objects.filter(member__in=member_ids).delete()
+        cls.objects.bulk_create(
+            cls(member_id=row["member"], year=row["year"], play_count=row["play_count"]) for row in rows
+        )
+
+    @classmethod
+    def add(cls, year: int, member_ids, delta: int) -> None:
+        """Add `delta` to the number of CTFs the given members played in `year`
+        """
+        if not year or not member_ids or not delta:
+            return
+        if delta > 0:
+            cls.objects.bulk_create([cls(member_id=member_id, year=year) for member_id in member_ids], ignore_conflicts=True)
+        rows = cls.objects.filter(member__in=member_ids, year=year)
+        rows.update(play_count=F("play_count") + delta)
+        if delta < 0:
+            rows.filter(play_count__lte=0).delete()
+
+
+class CategoryYearStats(TimeStampedModel):
+    """
+    Number of solves (a challenge solved by N members counting N times) per category per year
+    """
+    category = models.ForeignKey(ChallengeCategory, on_delete=models.CASCADE, related_name="year_stats")
+    year = models.IntegerField()
+    solve_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["category", "year"], name="ctfpad_categoryyearstats_unique"),
+        ]
+
+    @classmethod
+    def refresh(cls, years: list) -> None:
+        """Recompute the solves per category of the CTFs of the given years
+        """
+        rows = Challenge.solvers.through.objects.filter(
+            challenge__category__isnull=False,
+            challenge__ctf__start_date__year__in=years,
+        ).values(
+            "challenge__category", year=ExtractYear("challenge__ctf__start_date")
+        ).annotate(
+            solve_count=Count("id")
+        )
+
+        cls.objects.filter(year__in=years).delete()
+        cls.objects.bulk_create(
+            cls(category_id=row["challenge__category"], year=row["year"], solve_count=row["solve_count"]) for row in rows
+        )
+
+    @classmethod
+    def add(cls, year: int, category_id, delta: int) -> None:
+        """Add `delta` to the number of solves of a category in `year`
+        """
+        if not year or not category_id or not delta:
+            return
+        if delta > 0:
+            cls.objects.bulk_create([cls(category_id=category_id, year=year)], ignore_conflicts=True)
+        rows = cls.objects.filter(category_id=category_id, year=year)
+        rows.update(solve_count=F("solve_count") + delta)
+        if delta < 0:
+            rows.filter(solve_count__lte=0).delete()
+
+
 class CtfStats:
     """
     Statistic collection class
@@ -562,72 +1320,215 @@ class CtfStats:
     def __init__(self, year):
         self.year = year
 
+    @staticmethod
+    def version_key(year: int) -> str:
+        return f"stats:{year}:version"
+
+    @classmethod
+    def invalidate(cls, *years) -> None:
+        """Bump the version of the cached stats of the given years
+        """
+        for year in set(years):
+            key = cls.version_key(year)
+            cache.add(key, 1, None)
+            cache.incr(key)
+
+    def cache_timeout(self) -> int:
+        """The cached stats must expire when the next CTF of the year ends, as it then enters the rankings
+        """
+        now = datetime.now()
+        next_end = Ctf.objects.filter(
+            start_date__year=self.year,
+            end_date__gt=now,
+        ).aggregate(
+            Min('end_date')
+        )['end_date__min']
+        if not next_end:
+            return STATS_CACHE_TIMEOUT
+        return max(1, min(STATS_CACHE_TIMEOUT, int((next_end - now).total_seconds()) + 1))
+
+    def cached_stats(self) -> dict:
+        """Return the stats of the year computed from the challenges, from the cache unless a challenge of the
+        year changed (see `invalidate`) since they were computed
+        """
+        version = cache.get_or_set(self.version_key(self.year), 1, None)
+        key = f"stats:{self.year}:{version}"
+        stats = cache.get(key)
+        if stats is None:
+            stats = {
+                "player_activity": self.player_activity(),
+                "category_stats": list(self.category_stats()),
+                "ctf_stats": self.ctf_stats(),
+                "ranking_stats": self.ranking_stats(),
+            }
+            cache.set(key, stats, self.cache_timeout())
+        return stats
+
+    @staticmethod
+    def challenge_solves(challenge_ids) -> dict:
+        """
+        Returns:
+            dict: the `ChallengeSolves` of the given challenges as stored in the database, indexed by challenge ID
+        """
+        solvers = {}
+        for challenge_id, member_id in Challenge.solvers.through.objects.filter(challenge__in=challenge_ids).values_list("challenge", "member"):
+            solvers.setdefault(challenge_id, set()).add(member_id)
+        return {
+            pk: ChallengeSolves(ctf_id, start_date.year if start_date else None, category_id, points, solvers.get(pk, set()))
+            for pk, ctf_id, start_date, category_id, points in Challenge.objects.filter(
+                pk__in=challenge_ids
+            ).values_list(
+                "pk", "ctf", "ctf__start_date", "category", "points"
+            )
+        }
+
+    @staticmethod
+    def update_challenge(before: ChallengeSolves, after: ChallengeSolves) -> None:
+        """Apply to the aggregate tables the deltas of a challenge going from `before` to `after`: the points of a
+        challenge being split evenly between its solvers, all of them see their share change. A challenge moved to
+        another CTF leaves the previous one, then joins the new one.
+        """
+        if before.ctf_id != after.ctf_id:
+            CtfStats.update_challenge(before, before._replace(solvers=set()))
+            CtfStats.update_challenge(after._replace(solvers=set()), after)
+            return
+
+        share_before = before.points / len(before.solvers) if before.solvers else 0
+        share_after = after.points / len(after.solvers) if after.solvers else 0
+        deltas = {
+            member_id: (
+                (share_after if member_id in after.solvers else 0) - (share_before if member_id in before.solvers else 0),
+                (member_id in after.solvers) - (member_id in before.solvers),
+            )
+            for member_id in before.solvers | after.solvers
+        }
+
+        with transaction.atomic():
+            started, stopped = MemberCtfScore.add(after.ctf_id, deltas)
+            MemberYearStats.add(after.year, started, 1)
+            MemberYearStats.add(after.year, stopped, -1)
+            if (before.year, before.category_id) == (after.year, after.category_id):
+                CategoryYearStats.add(after.year, after.category_id, len(after.solvers) - len(before.solvers))
+            else:
+                CategoryYearStats.add(before.year, before.category_id, -len(before.solvers))
+                CategoryYearStats.add(after.year, after.category_id, len(after.solvers))
+
+        CtfStats.changed(after.ctf_id, before.year, after.year)
+
+    @staticmethod
+    def move_ctf(ctf: Ctf, year_before: int, year_after: int) -> None:
+        """Move the contribution of a CTF to the yearly tables from `year_before` to `year_after` (either being None
+        when the CTF has no start date, e.g. when it gets deleted)
+        """
+        member_ids = list(ctf.member_scores.values_list("member", flat=True))
+        category_solves = Challenge.solvers.through.objects.filter(
+            challenge__ctf=ctf
+        ).values_list(
+            "challenge__category"
+        ).annotate(
+            Count("id")
+        )
+
+        with transaction.atomic():
+            MemberYearStats.add(year_before, member_ids, -1)
+            MemberYearStats.add(year_after, member_ids, 1)
+            for category_id, count in category_solves:
+                CategoryYearStats.add(year_before, category_id, -count)
+                CategoryYearStats.add(year_after, category_id, count)
+
+        CtfStats.changed(ctf.pk, year_before, year_after)
+
+    @staticmethod
+    def changed(ctf_id, *years) -> None:
+        """Drop the cached stats of the given years, and the cached timeline of the CTF, once the change is committed
+        (before that, another request could cache them again from the previous state)
+        """
+        def invalidate():
+            CtfStats.invalidate(*(year for year in years if year))
+            cache.delete(Ctf(pk=ctf_id).timeline_cache_key)
+        transaction.on_commit(invalidate)
+
+    @staticmethod
+    def rebuild() -> None:
+        """Recompute the aggregate tables from scratch
+        """
+        with transaction.atomic():
+            MemberCtfScore.objects.all().delete()
+            MemberYearStats.objects.all().delete()
+            CategoryYearStats.objects.all().delete()
+
+            member_ids = MemberCtfScore.refresh(Ctf.objects.values_list("pk", flat=True))
+            MemberYearStats.refresh(member_ids)
+            years = [day.year for day in Ctf.objects.dates("start_date", "year")]
+            CategoryYearStats.refresh(years)
+
+        CtfStats.invalidate(*years)
+
     def members(self):
-        return Member.objects.select_related(
-            'user'
+        return Member.objects.with_stats(
+            self.year
         ).filter(
             creation_time__year__lte=self.year
         )
 
-    def player_activity(self) -> dict:
+    def player_activity(self) -> list:
         """Return the number of ctfs played per member
         """
-        return Member.objects.select_related(
-            'user'
-        ).filter(
-            solved_challenges__isnull=False,
-            solved_challenges__ctf__start_date__year=self.year
-        ).annotate(
-            play_count=Count('solved_challenges__ctf', distinct=True)
-        )
+        members = []
+        for row in MemberYearStats.objects.select_related('member__user').filter(year=self.year, play_count__gt=0):
+            row.member.play_count = row.play_count
+            members.append(row.member)
+        return members
 
     def category_stats(self) -> dict:
         """Return the total number of challenges solved per category
         """
-        return Challenge.objects.filter(
-            solvers__isnull=False,
-            ctf__start_date__year=self.year
-        ).values("category__name").annotate(
-            Count("category")
+        return CategoryYearStats.objects.filter(
+            year=self.year
+        ).order_by(
+            'category__name'
+        ).values(
+            'category__name', 'solve_count'
         )
 
     def ctf_stats(self) -> dict:
-        """Return a monthly count of public CTFs played
+        """Return a monthly count of CTFs played (i.e. having challenges), every month of the year included
         """
-        ctfs = Ctf.objects.filter(
-            challenge__isnull=False,
+        counts = dict(Ctf.objects.filter(
+            Exists(Challenge.objects.filter(ctf=OuterRef('pk'))),
             start_date__year=self.year,
         ).annotate(
-            month=TruncMonth('start_date')
-        ).order_by(
-            'start_date'
-        ).distinct()
+            month=ExtractMonth('start_date')
+        ).values_list(
+            'month'
+        ).annotate(
+            count=Count('id')
+        ).order_by())
 
-        monthly_counts = [(k.strftime('%Y/%m'), v) for k, v in sorted(
-            Counter(ctf.month for ctf in ctfs).items())]
+        monthly_counts = [(f"{self.year}/{month:02d}", counts.get(month, 0)) for month in range(1, 13)]
 
         return {'monthly_counts': monthly_counts}
 
     def year_stats(self) -> list:
-        """Return a yearly count of public CTFs played
+        """Return a yearly count of public CTFs played, oldest year first
         """
         return Ctf.objects.filter(
             start_date__isnull = False,
             visibility='public'
+        ).annotate(
+            year=ExtractYear('start_date')
         ).values_list(
-            'start_date__year'
+            'year'
         ).annotate(
-            Count('start_date__year')
+            count=Count('id')
+        ).order_by(
+            'year'
         )
 
     def ranking_stats(self) -> dict:
         """Return the all time and last CTFs rankings
         """
-        qs = Ctf.objects.prefetch_related(
-            'challenge_set',
-            'challenge_set__solvers',
-            'challenge_set__solvers__user',
-        ).filter(
+        qs = Ctf.objects.filter(
             visibility='public',
             rating__gt=0,
             end_date__lt=datetime.now(), # finished ctfs only
@@ -638,72 +1539,271 @@ class CtfStats:
             'start_date'
         ).distinct()
 
-        members = set()
-        ctfs = []
-
-        for ctf in qs:
-            ctf.member_points = {}
+        ctfs = list(qs)
+        ctf_index = {ctf.pk: i for i, ctf in enumerate(ctfs)}
 
-            for chall in ctf.challenge_set.all():
-                for member in chall.solvers.all():
-                    if member not in ctf.member_points:
-                        ctf.member_points[member] = 0
-                        members.add(member)
+        # share of the points of each member in each CTF, as a (CTF x member) matrix
+        scores = MemberCtfScore.objects.filter(
+            ctf__in=ctfs
+        ).annotate(
+            ctf_points=Window(Sum('points'), partition_by=F('ctf'))
+        ).annotate(
+            share=F('points') / NullIf(F('ctf_points'), 0.0)
+        ).values_list(
+            'ctf', 'member', 'share'
+        )
 
-                    points = chall.points / len(chall.solvers.all())
-                    ctf.member_points[member] += points
+        shares = {}
+        for ctf_id, member_id, share in scores:
+            shares.setdefault(member_id, [0.0] * len(ctfs))[ctf_index[ctf_id]] = share or 0.0
 
-            ctfs.append(ctf)
+        members = list(Member.objects.select_related('user').filter(pk__in=shares).order_by('pk'))
+        ratings = [ctf.rating for ctf in ctfs]
 
         for member in members:
-            member.percents = OrderedDict()
-            member.ratings = OrderedDict()
-            member.rating_accu = 0
+            member_shares = shares[member.pk]
+            accus = list(itertools.accumulate(
+                (rating * share for rating, share in zip(ratings, member_shares)),
+                lambda accu, rating: round(accu + rating, 2),
+                initial=0,
+            ))[1:]
+            percents = [100 * share for share in member_shares]
+
+            member.rating_accu = accus[-1] if accus else 0
+            # keyed by CTF ID, as CTFs also reference members through `ranking` (the result must be picklable)
+            member.ratings = OrderedDict(zip(ctf_index, accus))
+            member.percents = OrderedDict(zip(ctf_index, percents))
+            member.percent = round(fmean(percents), 2) if percents else 0
 
-        for ctf in ctfs:
-            ctf.member_percents = {}
+        alltime_ranking = sorted(members, key=lambda x: x.rating_accu, reverse=True)
 
-            first_points = max(ctf.member_points.values())
-            total_points = sum(ctf.member_points.values())
+        for i, ctf in enumerate(ctfs):
+            ctf.ranking = sorted(
+                ((member, 100 * shares[member.pk][i]) for member in members), key=lambda x: x[1], reverse=True
+            )
 
-            for member in members:
-                percent = 0
-                rating = 0
+        return {'alltime': alltime_ranking, 'last_ctfs': ctfs[::-1]}
 
-                if member in ctf.member_points:
-                    points = ctf.member_points[member]
-                    rating = ctf.rating * points / total_points
-                    percent = 100 * points / total_points
 
-                member.rating_accu = round(member.rating_accu + rating, 2)
-                member.ratings[ctf] = member.rating_accu
-                member.percents[ctf] = percent
+SearchResult = namedtuple("SearchResult", "category name description link" )
 
-                ctf.member_percents[member] = percent
 
-        # alltime ranking and timeline
-        for member in members:
-            member.percent = round(mean(member.percents.values()), 2)
+class SearchResults:
+    """
+    Lazy sequence of the `SearchResult` built from a queryset: only the number of results and the slices actually
+    accessed (i.e. the displayed page) are fetched from the database.
+    """
+    def __init__(self, queryset, to_results):
+        self.queryset = queryset
+        self.to_results = to_results
 
-        alltime_ranking = sorted(members, key=lambda x: x.rating_accu, reverse=True)
+    @cached_property
+    def total(self) -> int:
+        return self.queryset.count()
 
-        # last CTFs
-        for ctf in ctfs:
-            ctf.ranking = sorted(ctf.member_percents.items(), key=lambda x: x[1], reverse=True)
+    def count(self) -> int:
+        return self.total
 
-        return {'alltime': alltime_ranking, 'last_ctfs': ctfs[::-1]}
+    def __len__(self) -> int:
+        return self.total
 
+    def __iter__(self):
+        return iter(self.to_results(list(self.queryset)))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.to_results(list(self.queryset[key]))
+        return self.to_results([self.queryset[key]])[0]
+
+
+class SearchCache:
+    """
+    Search results cached in Django's cache framework. Keys embed a version number, bumped by the signals of `signals.py`
+    whenever one of the searched models changes: invalidating the whole cache is a single increment.
+    """
+    VERSION_KEY = "search:version"
+    HITS_KEY = "search:hits"
+    MISSES_KEY = "search:misses"
+
+    @staticmethod
+    def incr(key: str, initial: int = 0) -> int:
+        cache.add(key, initial, None)
+        return cache.incr(key)
+
+    @classmethod
+    def key(cls, *args) -> str:
+        version = cache.get_or_set(cls.VERSION_KEY, 1, None)
+        digest = hashlib.sha256("|".join(str(arg) for arg in args).encode()).hexdigest()
+        return f"search:{version}:{digest}"
+
+    @staticmethod
+    def get(key: str):
+        return cache.get(key)
+
+    @staticmethod
+    def set(key: str, value) -> None:
+        cache.set(key, value, SEARCH_CACHE_TIMEOUT)
+
+    @classmethod
+    def invalidate(cls) -> None:
+        cls.incr(cls.VERSION_KEY, 1)
+
+    @classmethod
+    def record(cls, hit: bool) -> None:
+        """Count a search as a hit or a miss, once per search rather than per cached page or count
+        """
+        cls.incr(cls.HITS_KEY if hit else cls.MISSES_KEY)
+
+    @classmethod
+    def stats(cls) -> dict:
+        hits = cache.get(cls.HITS_KEY, 0)
+        misses = cache.get(cls.MISSES_KEY, 0)
+        return {
+            "version": cache.get(cls.VERSION_KEY, 1),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+
+
+class ChainedSearchResults:
+    """
+    Lazy concatenation of the `SearchResults` of several categories. Slicing only queries the
+    categories overlapping the slice, with the matching offset & limit. If a `cache_key` is given,
+    the slices are cached. If a `timeout` is given, the categories are queried in parallel and the
+    ones slower than `timeout` seconds are dropped.
+    """
+    # shared by all the searches of the process, so that they never hold more than
+    # `SEARCH_MAX_CONCURRENT_QUERIES` database connections
+    pool = ThreadPoolExecutor(max_workers=SEARCH_MAX_CONCURRENT_QUERIES, thread_name_prefix="search")
+
+    def __init__(self, parts: dict, cache_key: str = None, timeout: float = None):
+        self.parts = parts
+        self.cache_key = cache_key
+        self.timeout = timeout
+        self.dropped = []
+
+    @staticmethod
+    def run_query(query, timeout: float):
+        # the search threads keep their database connection from one search to the next, while it is usable
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL statement_timeout = %s", [int(timeout * 1000)])
+            return query()
+
+    def run_concurrently(self, queries: dict, timeout: float) -> dict:
+        """Run the `queries` (callables indexed by category) in parallel on the search threads. The categories
+        that failed, or did not complete within `timeout` seconds are added to `dropped`. On PostgreSQL their
+        queries are also cancelled by a statement timeout, so they don't keep running in the background.
+
+        Returns:
+            dict: the result of the completed queries, indexed by category
+        """
+        futures = {self.pool.submit(self.run_query, query, timeout): category for category, query in queries.items()}
+        done, not_done = wait(futures, timeout=timeout)
+        for future in not_done:
+            future.cancel()
+
+        values = {}
+        for future, category in futures.items():
+            if future in done and future.exception() is None:
+                values[category] = future.result()
+            elif category not in self.dropped:
+                self.dropped.append(category)
+        return values
+
+    def count_concurrently(self) -> list:
+        """Count the results of all the categories in parallel, dropping the ones that did not complete within
+        the timeout.
+
+        Returns:
+            list: the dropped categories
+        """
+        counts = self.run_concurrently(
+            {category: (lambda results=results: results.total) for category, results in self.parts.items()},
+            self.timeout,
+        )
+        for category in list(self.parts):
+            if category not in counts:
+                del self.parts[category]
+        return self.dropped
+
+    @property
+    def counts(self) -> dict:
+        return {category: len(results) for category, results in self.parts.items()}
+
+    def count(self) -> int:
+        return sum(self.counts.values())
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.parts.values())
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            if key < 0:
+                key += len(self)
+            items = self[key:key + 1]
+            if not items:
+                raise IndexError("search result index out of range")
+            return items[0]
+
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            raise ValueError("search results can only be sliced contiguously")
+
+        # partial results are not worth caching, the next search may be luckier
+        if self.cache_key and not self.dropped:
+            items = SearchCache.get(f"{self.cache_key}:{start}:{stop}")
+            if items is None:
+                items = self.fetch(start, stop)
+                if not self.dropped:
+                    SearchCache.set(f"{self.cache_key}:{start}:{stop}", items)
+            return items
+
+        return self.fetch(start, stop)
+
+    def fetch(self, start: int, stop: int) -> list:
+        slices = {}
+        offset = 0
+        for category, results in self.parts.items():
+            if offset >= stop:
+                break
+            size = len(results)
+            if start < offset + size:
+                slices[category] = (results, max(start - offset, 0), min(stop - offset, size))
+            offset += size
+
+        if self.timeout is None:
+            pages = {category: results[first:last] for category, (results, first, last) in slices.items()}
+        else:
+            # a category too slow to fetch is left out of the page, but keeps its count so that the other pages don't shift
+            pages = self.run_concurrently(
+                {category: (lambda results=results, first=first, last=last: results[first:last]) for category, (results, first, last) in slices.items()},
+                self.timeout,
+            )
+        return list(itertools.chain.from_iterable(pages[category] for category in slices if category in pages))
 
-SearchResult = namedtuple("SearchResult", "category name description link" )
 
 class SearchEngine:
     """A very basic^Mbad search engine
     """
 
-    def __init__(self, query, *args, **kwargs):
+    def __init__(self, query, fuzzy=False, member=None, *args, **kwargs):
         query = query.lower()
         patterns = query.split()
         self.selected_category = None
+        self.fuzzy = fuzzy
+
+        # members without private CTFs all see the same results, hence share the cached ones
+        self.scope = "public"
+        if member is not None and Ctf.objects.filter(visibility="private", created_by=member).exists():
+            self.scope = f"member:{member.pk}"
 
         # if a specific category was selected, use it
         for p in patterns:
@@ -715,179 +1815,329 @@ class SearchEngine:
                     break
 
         query = " ".join(patterns)
-        self.results = []
+        self.results = self.search(query, self.selected_category, self.fuzzy, member, self.scope)
 
-        if self.selected_category is None:
-            for cat in VALID_SEARCH_CATEGORIES:
-                handle = VALID_SEARCH_CATEGORIES[cat]
-                self.results.extend( handle(query) )
-        else:
-            handle = VALID_SEARCH_CATEGORIES[self.selected_category]
-            self.results.extend( handle(query) )
+        # nothing found, maybe a typo: retry with approximate matching
+        if not self.results and not self.partial and not self.fuzzy:
+            self.fuzzy = True
+            self.results = self.search(query, self.selected_category, self.fuzzy, member, self.scope)
         return
 
 
+    @staticmethod
+    def search(query: str, category: str = None, fuzzy: bool = False, member=None, scope: str = "public") -> ChainedSearchResults:
+        categories = VALID_SEARCH_CATEGORIES if category is None else [category, ]
+        cache_key = SearchCache.key(" ".join(query.split()), category, fuzzy, scope)
+        # when searching everywhere, a slow category must not hold back the others
+        timeout = SEARCH_TIMEOUT if len(categories) > 1 else None
+        results = ChainedSearchResults({
+            cat: VALID_SEARCH_CATEGORIES[cat](query, fuzzy, member) for cat in categories
+        }, cache_key, timeout)
+
+        counts = SearchCache.get(f"{cache_key}:counts")
+        SearchCache.record(counts is not None)
+        if counts is not None:
+            for cat, count in counts.items():
+                results.parts[cat].total = count
+            return results
+
+        if timeout is not None:
+            results.count_concurrently()
+
+        # partial results are not worth caching, the next search may be luckier
+        if not results.dropped:
+            SearchCache.set(f"{cache_key}:counts", results.counts)
+        return results
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.results.dropped)
+
+
+    @staticmethod
+    def full_text_query(query: str) -> SearchQuery:
+        """Parse the user query like a web search engine would: terms are and'ed, and "quoted phrases", `or` and `-excluded`
+        terms are supported.
+        """
+        return SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+
+
+    @staticmethod
+    def visible_ctfs(member, prefix: str = "") -> Q:
+        """Match the public CTFs, and the private ones of `member` (`prefix` being the lookup path to the CTF)
+        """
+        q = Q(**{f"{prefix}visibility": "public"})
+        if member is not None:
+            q |= Q(**{f"{prefix}created_by": member})
+        return q
+
+
+    @staticmethod
+    def name_lookup(field: str, query: str, fuzzy: bool) -> Q:
+        """Match `field` containing the query case-insensitively, or in fuzzy mode a part of `field` looking like it
+        (word similarity above `pg_trgm.word_similarity_threshold`). Both are served by the trigram index on `UPPER(field)`.
+        """
+        if fuzzy:
+            return Q(TrigramWordSimilar(Upper(field), query.upper()))
+        return Q(Contains(Upper(field), query.upper()))
+
+
     @classmethod
-    def search_in_ctfs(cls, query: str) -> list:
-        """ search in ctf name & description
+    def search_in_ctfs(cls, query: str, fuzzy: bool = False, member=None) -> SearchResults:
+        """ full-text search in ctf name & description, best matches first
 
         Args:
             query (str): [description]
+            fuzzy (bool): approximate matching of the names
+            member (Member): the member searching, only the CTFs visible to them are searched
 
         Returns:
-            list: [description]
+            SearchResults: [description]
         """
-        results = []
-        for entry in Ctf.objects.filter(
-                Q(name__icontains = query) |
-                Q(description__icontains = query)
-            ):
-            if query.lower() in entry.name:
-                description = entry.name
-            else:
-                description = entry.description[50:]
-            results.append(
-                SearchResult(
-                    "ctf",
-                    entry.name,
-                    description,
-                    reverse("ctfpad:ctfs-detail", kwargs={"pk": entry.id})
+        search_query = cls.full_text_query(query)
+        queryset = Ctf.objects.filter(
+                Q(search_vector = search_query) |
+                cls.name_lookup("name", query, fuzzy),
+                cls.visible_ctfs(member),
+            ).annotate(
+                rank = SearchRank(F("search_vector"), search_query) + TrigramWordSimilarity(query, "name")
+            ).order_by("-rank", "pk")
+
+        def to_results(entries: list) -> list:
+            results = []
+            for entry in entries:
+                if query.lower() in entry.name.lower():
+                    description = entry.name
+                else:
+                    description = entry.description[:50]
+                results.append(
+                    SearchResult(
+                        "ctf",
+                        entry.name,
+                        description,
+                        reverse("ctfpad:ctfs-detail", kwargs={"pk": entry.id})
+                    )
                 )
-            )
-        return results
+            return results
+
+        return SearchResults(queryset, to_results)
 
 
     @classmethod
-    def search_in_challenges(cls, query: str) -> list:
-        """ search in challenge name & description
+    def search_in_challenges(cls, query: str, fuzzy: bool = False, member=None) -> SearchResults:
+        """ full-text search in challenge name & description, best matches first
 
         Args:
             query (str): [description]
+            fuzzy (bool): approximate matching of the names
+            member (Member): the member searching, only the CTFs visible to them are searched
 
         Returns:
-            list: [description]
+            SearchResults: [description]
         """
-        results = []
-        for entry in Challenge.objects.filter(
-                Q(name__icontains = query) |
-                Q(description__icontains = query)
-            ):
-            if query.lower() in entry.name:
-                description = entry.name
-            else:
-                description = entry.description[50:]
-            results.append(
-                SearchResult(
-                    "challenge",
-                    entry.name,
-                    description,
-                    reverse("ctfpad:challenges-detail", kwargs={"pk": entry.id})
+        search_query = cls.full_text_query(query)
+        queryset = Challenge.objects.filter(
+                Q(search_vector = search_query) |
+                cls.name_lookup("name", query, fuzzy),
+                cls.visible_ctfs(member, "ctf__"),
+            ).annotate(
+                rank = SearchRank(F("search_vector"), search_query) + TrigramWordSimilarity(query, "name")
+            ).order_by("-rank", "pk")
+
+        def to_results(entries: list) -> list:
+            results = []
+            for entry in entries:
+                if query.lower() in entry.name.lower():
+                    description = entry.name
+                else:
+                    description = entry.description[:50]
+                results.append(
+                    SearchResult(
+                        "challenge",
+                        entry.name,
+                        description,
+                        reverse("ctfpad:challenges-detail", kwargs={"pk": entry.id})
+                    )
                 )
-            )
-        return results
+            return results
+
+        return SearchResults(queryset, to_results)
 
 
     @classmethod
-    def search_in_members(cls, query: str) -> list:
-        """search members
+    def search_in_members(cls, query: str, fuzzy: bool = False, member=None) -> SearchResults:
+        """ full-text search in members username, email & description, best matches first
 
         Args:
             query (str): [description]
+            fuzzy (bool): approximate matching of the names
+            member (Member): the member searching, only the CTFs visible to them are searched
 
         Returns:
-            list: [description]
-        """
-        results = []
-        for entry in Member.objects.filter(
-                    Q(user__username__icontains = query) |
-                    Q(user__email__icontains = query) |
-                    Q(description__icontains = query)
-                ):
-            results.append(
+            SearchResults: [description]
+        """
+        search_query = cls.full_text_query(query)
+        queryset = Member.objects.select_related("user").filter(
+                Q(search_vector = search_query) |
+                cls.name_lookup("user__username", query, fuzzy)
+            ).annotate(
+                rank = SearchRank(F("search_vector"), search_query) + TrigramWordSimilarity(query, "user__username")
+            ).order_by("-rank", "pk")
+
+        def to_results(entries: list) -> list:
+            return [
                 SearchResult(
                     "member",
                     entry.username,
                     entry.description,
                     reverse("ctfpad:users-detail", kwargs={"pk": entry.id})
-                )
-            )
-        return results
+                ) for entry in entries
+            ]
+
+        return SearchResults(queryset, to_results)
 
 
     @classmethod
-    def search_in_categories(cls, query: str) -> list:
-        """search pattern in categories
+    def search_in_categories(cls, query: str, fuzzy: bool = False, member=None) -> SearchResults:
+        """search the challenges by category name
 
         Args:
             query (str): [description]
+            fuzzy (bool): approximate matching of the names
+            member (Member): the member searching, only the CTFs visible to them are searched
 
         Returns:
-            list: [description]
+            SearchResults: [description]
         """
-        results = []
-        for entry in ChallengeCategory.objects.filter(
-                Q(name__icontains = query)
-            ):
-            for challenge in entry.challenge_set.all():
-                results.append(
-                    SearchResult(
-                        "category",
-                        challenge.name,
-                        f"{challenge.name} - ({challenge.ctf})",
-                        reverse("ctfpad:challenges-detail", kwargs={"pk": challenge.id})
-                    )
-                )
-        return results
+        queryset = Challenge.objects.select_related("ctf").filter(
+                cls.name_lookup("category__name", query, fuzzy),
+                cls.visible_ctfs(member, "ctf__"),
+            ).annotate(
+                similarity = TrigramWordSimilarity(query, "category__name")
+            ).order_by("-similarity", "category__name", "pk")
+
+        def to_results(entries: list) -> list:
+            return [
+                SearchResult(
+                    "category",
+                    challenge.name,
+                    f"{challenge.name} - ({challenge.ctf})",
+                    reverse("ctfpad:challenges-detail", kwargs={"pk": challenge.id})
+                ) for challenge in entries
+            ]
+
+        return SearchResults(queryset, to_results)
 
 
     @classmethod
-    def search_in_tags(cls, query: str) -> list:
-        """search tags
+    def search_in_tags(cls, query: str, fuzzy: bool = False, member=None) -> SearchResults:
+        """search the challenges by tag name
 
         Args:
             query (str): [description]
+            fuzzy (bool): approximate matching of the names
+            member (Member): the member searching, only the CTFs visible to them are searched
 
         Returns:
-            list: [description]
+            SearchResults: [description]
         """
-        results = []
-        for entry in Tag.objects.filter(
-                Q(name__icontains = query)
-            ):
-            for challenge in entry.challenges.all():
-                results.append(
-                    SearchResult(
-                        "tag",
-                        challenge.name,
-                        f"{challenge.name} - ({challenge.ctf})",
-                        reverse("ctfpad:challenges-detail", kwargs={"pk": challenge.id})
-                    )
-                )
-        return results
+        # a challenge having several matching tags is only listed once, with its best matching tag
+        queryset = Challenge.objects.select_related("ctf").filter(
+                cls.name_lookup("tags__name", query, fuzzy),
+                cls.visible_ctfs(member, "ctf__"),
+            ).annotate(
+                similarity = Max(TrigramWordSimilarity(query, "tags__name"))
+            ).order_by("-similarity", "pk")
+
+        def to_results(entries: list) -> list:
+            return [
+                SearchResult(
+                    "tag",
+                    challenge.name,
+                    f"{challenge.name} - ({challenge.ctf})",
+                    reverse("ctfpad:challenges-detail", kwargs={"pk": challenge.id})
+                ) for challenge in entries
+            ]
+
+        return SearchResults(queryset, to_results)
 
 
     @classmethod
-    def search_in_ctftime(cls, query: str) -> list:
+    def search_in_ctftime(cls, query: str, fuzzy: bool = False, member=None) -> SearchResults:
         """search ctfs in ctftime
 
         Args:
             query (str): [description]
+            fuzzy (bool): approximate matching of the names
+            member (Member): the member searching, only the CTFs visible to them are searched
+
+        Returns:
+            SearchResults: [description]
+        """
+        queryset = CtftimeEvent.current_and_future(running=False, future=True).filter(
+                cls.name_lookup("title", query, fuzzy) |
+                Q(description__icontains = query)
+            )
+
+        def to_results(entries: list) -> list:
+            return [
+                SearchResult(
+                    "ctftime",
+                    entry.title,
+                    entry.description,
+                    reverse("ctfpad:ctfs-import") + f"?ctftime_id={entry.id}"
+                ) for entry in entries
+            ]
+
+        return SearchResults(queryset, to_results)
+
+
+    @classmethod
+    def search_in_notes(cls, query: str, fuzzy: bool = False, member=None) -> SearchResults:
+        """full-text search in the (locally mirrored) notes of the ctfs & challenges, best matches first
+
+        Args:
+            query (str): [description]
+            fuzzy (bool): ignored, notes have no name to match approximately
+            member (Member): the member searching, only the CTFs visible to them are searched
 
         Returns:
-            list: [description]
+            SearchResults: [description]
         """
-        results = []
-        for entry in ctftime_ctfs(running=False, future=True):
-            if query in entry["title"].lower() or query in entry["description"].lower():
+        search_query = cls.full_text_query(query)
+        queryset = NoteSnapshot.objects.filter(
+                Q(note_id__in = Ctf.objects.filter(cls.visible_ctfs(member)).values("note_id")) |
+                Q(note_id__in = Challenge.objects.filter(cls.visible_ctfs(member, "ctf__")).values("note_id")),
+                search_vector = search_query,
+            ).annotate(
+                rank = SearchRank("search_vector", search_query),
+                snippet = SearchHeadline("body", search_query, config=SEARCH_CONFIG, start_sel="**", stop_sel="**", max_words=35, min_words=15),
+            ).order_by(
+                "-rank", "pk"
+            ).values_list("note_id", "snippet")
+
+        def to_results(entries: list) -> list:
+            snippets = dict(entries)
+            owners = {}
+            for entry in Ctf.objects.filter(note_id__in = snippets.keys()):
+                owners[entry.note_id] = (entry.name, reverse("ctfpad:ctfs-detail", kwargs={"pk": entry.id}))
+            for entry in Challenge.objects.select_related("ctf").filter(note_id__in = snippets.keys()):
+                owners[entry.note_id] = (f"{entry.name} - ({entry.ctf})", reverse("ctfpad:challenges-detail", kwargs={"pk": entry.id}))
+
+            results = []
+            for note_id, snippet in entries:
+                name, link = owners[note_id]
                 results.append(
                     SearchResult(
-                        "ctftime",
-                        entry["title"],
-                        entry["description"],
-                        reverse("ctfpad:ctfs-import") + f"?ctftime_id={entry['id']}"
+                        "note",
+                        name,
+                        snippet,
+                        link
                     )
                 )
-        return results
+            return results
+
+        return SearchResults(queryset, to_results)
 
 
 VALID_SEARCH_CATEGORIES = {
@@ -897,4 +2147,5 @@ VALID_SEARCH_CATEGORIES = {
     "category" :   SearchEngine.search_in_categories,
     "tag" :        SearchEngine.search_in_tags,
     "ctftime" :    SearchEngine.search_in_ctftime,
+    "note" :       SearchEngine.search_in_notes,
 }
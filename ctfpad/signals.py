@@ -1,9 +1,13 @@
 import random, datetime
 
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from ctfpad.models import Challenge, Ctf
+from django.contrib.auth.models import User
+
+from ctfpad.models import Challenge, ChallengeCategory, Ctf, CtfStats, Member, SearchCache, Tag
 from ctfpad.helpers import discord_send_message, get_current_site
 from ctftools.settings import (
     DISCORD_BOT_NAME
@@ -96,3 +100,199 @@ Flag: `{instance.flag}`
 """,
     }]}
     return discord_send_message(js)
+
+
+
+@receiver(post_save, sender=Ctf, dispatch_uid="ctf_refresh_search_vector")
+@receiver(post_save, sender=Challenge, dispatch_uid="challenge_refresh_search_vector")
+@receiver(post_save, sender=Member, dispatch_uid="member_refresh_search_vector")
+def refresh_search_vector(sender, instance, **kwargs: dict) -> None:
+    sender.refresh_search_vector(pk=instance.pk)
+
+
+def is_login_update(sender, update_fields) -> bool:
+    # `update_last_login` saves the user on every login, which changes nothing searchable
+    return sender is User and update_fields == {"last_login"}
+
+
+@receiver(post_save, sender=User, dispatch_uid="user_refresh_member_search_vector")
+def refresh_member_search_vector(sender, instance: User, update_fields=None, **kwargs: dict) -> None:
+    if is_login_update(sender, update_fields):
+        return
+    Member.refresh_search_vector(user=instance)
+
+
+@receiver(post_save, sender=Ctf, dispatch_uid="ctf_save_invalidate_search_cache")
+@receiver(post_delete, sender=Ctf, dispatch_uid="ctf_delete_invalidate_search_cache")
+@receiver(post_save, sender=Challenge, dispatch_uid="challenge_save_invalidate_search_cache")
+@receiver(post_delete, sender=Challenge, dispatch_uid="challenge_delete_invalidate_search_cache")
+@receiver(m2m_changed, sender=Challenge.tags.through, dispatch_uid="challenge_tags_invalidate_search_cache")
+@receiver(post_save, sender=Member, dispatch_uid="member_save_invalidate_search_cache")
+@receiver(post_delete, sender=Member, dispatch_uid="member_delete_invalidate_search_cache")
+@receiver(post_save, sender=User, dispatch_uid="user_save_invalidate_search_cache")
+@receiver(post_save, sender=Tag, dispatch_uid="tag_save_invalidate_search_cache")
+@receiver(post_delete, sender=Tag, dispatch_uid="tag_delete_invalidate_search_cache")
+@receiver(post_save, sender=ChallengeCategory, dispatch_uid="category_save_invalidate_search_cache")
+@receiver(post_delete, sender=ChallengeCategory, dispatch_uid="category_delete_invalidate_search_cache")
+def invalidate_search_cache(sender, update_fields=None, **kwargs: dict) -> None:
+    if is_login_update(sender, update_fields):
+        return
+    SearchCache.invalidate()
+
+
+def is_direct_deletion(origin, model) -> bool:
+    # `origin` is the instance or queryset whose deletion cascaded to the deleted instance
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model)
+
+
+@receiver(post_save, sender=Challenge, dispatch_uid="challenge_save_update_stats")
+def update_stats_on_challenge_save(sender, instance: Challenge, created: bool, **kwargs: dict) -> None:
+    tracker = instance.stats_tracker
+    if created or not tracker.changed():
+        return
+    if not any(tracker.has_changed(field) for field in ("points", "category", "ctf")):
+        start_date = instance.ctf.start_date
+        CtfStats.changed(instance.ctf_id, start_date.year if start_date else None)
+        return
+    # the solvers are unchanged by the save, only the points, category and CTF may have moved
+    after = CtfStats.challenge_solves([instance.pk])[instance.pk]
+    before = after._replace(
+        points=tracker.previous("points"),
+        category_id=tracker.previous("category"),
+    )
+    if tracker.has_changed("ctf"):
+        start_date = Ctf.objects.filter(pk=tracker.previous("ctf")).values_list("start_date", flat=True).first()
+        before = before._replace(ctf_id=tracker.previous("ctf"), year=start_date.year if start_date else None)
+    CtfStats.update_challenge(before, after)
+
+
+@receiver(pre_delete, sender=Challenge, dispatch_uid="challenge_pre_delete_update_stats")
+def collect_stats_on_challenge_delete(sender, instance: Challenge, origin=None, **kwargs: dict) -> None:
+    # when a whole CTF is deleted, its contribution is removed at once (see `update_stats_on_ctf_delete`)
+    if is_direct_deletion(origin, Challenge):
+        instance._solves_before = CtfStats.challenge_solves([instance.pk]).get(instance.pk)
+
+
+@receiver(post_delete, sender=Challenge, dispatch_uid="challenge_delete_update_stats")
+def update_stats_on_challenge_delete(sender, instance: Challenge, **kwargs: dict) -> None:
+    before = getattr(instance, "_solves_before", None)
+    if before:
+        CtfStats.update_challenge(before, before._replace(solvers=set()))
+
+
+@receiver(pre_delete, sender=Member, dispatch_uid="member_pre_delete_update_stats")
+def collect_stats_on_member_delete(sender, instance: Member, **kwargs: dict) -> None:
+    # the solves of the member are deleted along with it, without `m2m_changed`. The CTFs it created go too, and
+    # their contribution with them (see `update_stats_on_ctf_delete`)
+    solved = instance.solved_challenges.exclude(ctf__created_by=instance).values_list("pk", flat=True)
+    instance._solves_before = CtfStats.challenge_solves(list(solved))
+
+
+@receiver(post_delete, sender=Member, dispatch_uid="member_delete_update_stats")
+def update_stats_on_member_delete(sender, instance: Member, **kwargs: dict) -> None:
+    # the same as removing the member from the solvers: the other solvers get its share
+    for before in instance._solves_before.values():
+        CtfStats.update_challenge(before, before._replace(solvers=before.solvers - {instance.pk}))
+
+
+@receiver(m2m_changed, sender=Challenge.solvers.through, dispatch_uid="challenge_solvers_update_stats")
+def update_stats_on_solvers_change(sender, instance, action: str, reverse: bool, pk_set: set, **kwargs: dict) -> None:
+    if action in ("pre_add", "pre_remove", "pre_clear"):
+        # `member.solved_challenges` side: `pk_set` holds challenges, and is unset when clearing
+        if not reverse:
+            challenge_ids = [instance.pk]
+        elif pk_set is None:
+            challenge_ids = list(instance.solved_challenges.values_list("pk", flat=True))
+        else:
+            challenge_ids = pk_set
+        instance._solves_before = CtfStats.challenge_solves(challenge_ids)
+        return
+
+    for before in instance._solves_before.values():
+        if reverse:
+            changed = {instance.pk}
+        else:
+            changed = before.solvers if pk_set is None else pk_set
+        solvers = before.solvers | changed if action == "post_add" else before.solvers - changed
+        CtfStats.update_challenge(before, before._replace(solvers=solvers))
+
+
+@receiver(post_save, sender=Ctf, dispatch_uid="ctf_save_update_stats")
+def update_stats_on_ctf_date_change(sender, instance: Ctf, created: bool, **kwargs: dict) -> None:
+    if created or not instance.start_date_tracker.has_changed("start_date"):
+        return
+    previous = instance.start_date_tracker.previous("start_date")
+    year_before = previous.year if previous else None
+    year_after = instance.start_date.year if instance.start_date else None
+    if year_before != year_after:
+        CtfStats.move_ctf(instance, year_before, year_after)
+    else:
+        CtfStats.changed(instance.pk, year_after)
+
+
+@receiver(pre_delete, sender=Ctf, dispatch_uid="ctf_delete_update_stats")
+def update_stats_on_ctf_delete(sender, instance: Ctf, **kwargs: dict) -> None:
+    # the scores of the CTF are deleted along with it, only the yearly tables are left to update
+    if instance.start_date:
+        CtfStats.move_ctf(instance, instance.start_date.year, None)
+
+
+@receiver(post_save, sender=Ctf, dispatch_uid="ctf_save_invalidate_stats_cache")
+@receiver(post_delete, sender=Ctf, dispatch_uid="ctf_delete_invalidate_stats_cache")
+def invalidate_stats_cache(sender, instance: Ctf, **kwargs: dict) -> None:
+    # the rating, visibility and dates of a CTF decide whether it is ranked
+    if instance.start_date:
+        year = instance.start_date.year
+        transaction.on_commit(lambda: CtfStats.invalidate(year))
+
+
+@receiver(post_save, sender=Challenge, dispatch_uid="challenge_save_update_ctf_counters")
+def update_ctf_counters_on_challenge_save(sender, instance: Challenge, created: bool, **kwargs: dict) -> None:
+    solved = instance.status == "solved"
+    if created:
+        previous_points, was_solved = 0, False
+    else:
+        previous_points = instance.stats_tracker.previous("points") or 0
+        was_solved = instance.stats_tracker.previous("status") == "solved"
+
+    if not created and instance.stats_tracker.has_changed("ctf"):
+        # the previous CTF loses what the challenge brought it, the new one gains what it brings now
+        Ctf.update_counters(
+            instance.stats_tracker.previous("ctf"),
+            challenge_count=-1,
+            solved_count=-int(was_solved),
+            total_points=-previous_points,
+            scored_points=-previous_points if was_solved else 0,
+        )
+        Ctf.update_counters(
+            instance.ctf_id,
+            challenge_count=1,
+            solved_count=int(solved),
+            total_points=instance.points,
+            scored_points=instance.points if solved else 0,
+        )
+        return
+
+    deltas = {
+        "challenge_count": int(created),
+        "solved_count": int(solved) - int(was_solved),
+        "total_points": instance.points - previous_points,
+        "scored_points": (instance.points if solved else 0) - (previous_points if was_solved else 0),
+    }
+    if any(deltas.values()):
+        Ctf.update_counters(instance.ctf_id, **deltas)
+
+
+@receiver(post_delete, sender=Challenge, dispatch_uid="challenge_delete_update_ctf_counters")
+def update_ctf_counters_on_challenge_delete(sender, instance: Challenge, origin=None, **kwargs: dict) -> None:
+    # the counters go along with the CTF when it is the one deleted
+    if not is_direct_deletion(origin, Challenge):
+        return
+    solved = instance.status == "solved"
+    Ctf.update_counters(
+        instance.ctf_id,
+        challenge_count=-1,
+        solved_count=-int(solved),
+        total_points=-instance.points,
+        scored_points=-instance.points if solved else 0,
+    )
@@ -0,0 +1,92 @@
+import bisect
+import re
+import threading
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from ctfpad.models import Challenge, Ctf, SearchCache, Tag
+
+
+class PrefixIndex:
+    """
+    In-memory sorted index of the CTF, challenge, tag and member names, for search-as-you-type. Every name is indexed
+    under each of its words, so that "crt" suggests "rsa-crt". The index is rebuilt on the next lookup whenever the
+    search cache version was bumped by a model change (see `signals.py`), so lookups never touch the database otherwise.
+    """
+
+    WORD_START = re.compile(r"(?<![0-9a-z])[0-9a-z]")
+
+    def __init__(self):
+        self.version = None
+        self.keys = []
+        self.entries = []
+        self.lock = threading.Lock()
+
+    def build(self) -> None:
+        # (indexed text, category, displayed name, link, owner): `owner` is the creator of a private CTF, None when public
+        entries = []
+        for pk, name, visibility, created_by in Ctf.objects.values_list("pk", "name", "visibility", "created_by"):
+            owner = (created_by or 0) if visibility == "private" else None
+            entries.append((name, "ctf", name, reverse("ctfpad:ctfs-detail", kwargs={"pk": pk}), owner))
+        for pk, name, ctf_name, visibility, created_by in Challenge.objects.values_list("pk", "name", "ctf__name", "ctf__visibility", "ctf__created_by"):
+            owner = (created_by or 0) if visibility == "private" else None
+            entries.append((name, "challenge", f"{name} - ({ctf_name})", reverse("ctfpad:challenges-detail", kwargs={"pk": pk}), owner))
+        for name in Tag.objects.values_list("name", flat=True):
+            entries.append((name, "tag", name, reverse("ctfpad:search") + "?" + urlencode({"q": f"cat:tag {name}"}), None))
+        for name, member_id in User.objects.filter(member__isnull=False).values_list("username", "member"):
+            entries.append((name, "member", name, reverse("ctfpad:users-detail", kwargs={"pk": member_id}), None))
+
+        index = []
+        for i, entry in enumerate(entries):
+            text = entry[0].lower()
+            for match in self.WORD_START.finditer(text):
+                index.append((text[match.start():], i))
+        index.sort()
+
+        self.keys = [key for key, _ in index]
+        self.entries = [entries[i][1:] for _, i in index]
+
+    def refresh(self) -> None:
+        version = cache.get_or_set(SearchCache.VERSION_KEY, 1, None)
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.build()
+                self.version = version
+
+    def lookup(self, prefix: str, limit: int, member=None) -> list:
+        """The first `limit` (by alphabetical order) names having a word starting with `prefix`.
+
+        Args:
+            prefix (str): the text typed so far
+            limit (int): the maximum number of suggestions
+            member (Member): the member typing, only the CTFs visible to them are suggested
+
+        Returns:
+            list: the suggestions as dicts
+        """
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+
+        self.refresh()
+        keys, entries = self.keys, self.entries
+
+        seen = set()
+        results = []
+        for i in range(bisect.bisect_left(keys, prefix), len(keys)):
+            if not keys[i].startswith(prefix) or len(results) >= limit:
+                break
+            category, name, link, owner = entries[i]
+            if link in seen or (owner is not None and (member is None or owner != member.pk)):
+                continue
+            seen.add(link)
+            results.append({"category": category, "name": name, "link": link})
+        return results
+
+
+prefix_index = PrefixIndex()
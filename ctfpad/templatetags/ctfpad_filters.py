@@ -1,4 +1,3 @@
-from collections import namedtuple
 from django import template
 from django.contrib import messages
 from django.utils.safestring import mark_safe
@@ -17,17 +16,6 @@ def as_local_datetime_for_member(naive_utc, member):
 def best_category(member, year=None):
     return member.best_category(year)
 
-@register.filter
-def as_time_accumulator_graph(items):
-    Point = namedtuple("Point", "time accu")
-    accu = 0
-    res = []
-    for x in items:
-        accu += x.points
-        res.append( Point(x.solved_time, accu) )
-    return res
-
-
 @register.simple_tag(takes_context = True)
 def theme_cookie(context):
     request = context['request']
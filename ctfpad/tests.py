@@ -1,3 +1,323 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from ctfpad.models import (
+    CategoryYearStats, Challenge, ChallengeCategory, Ctf, CtfStats, HedgedocProvisioningJob, Member, MemberCtfScore, MemberYearStats,
+    SearchEngine, Tag, Team,
+)
 
 # Create your tests here.
+
+class SearchEngineQueryCountTest(TestCase):
+    """
+    Searching by category or tag must cost a constant number of queries, whatever the number of matching challenges
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        team = Team.objects.create(name="team", email="team@ctfpad.localdomain")
+        user = User.objects.create_user("player", "player@ctfpad.localdomain", "password")
+        cls.member = member = Member(user=user, team=team)
+        member.save()
+
+        category = ChallengeCategory.objects.create(name="crypto")
+        tags = [Tag.objects.create(name="rsa"), Tag.objects.create(name="rsa-crt")]
+        for i in range(5):
+            ctf = Ctf.objects.create(name=f"ctf-{i}", created_by=member, visibility="private")
+            for j in range(10):
+                challenge = Challenge(name=f"challenge-{i}-{j}", ctf=ctf, category=category)
+                challenge.save()
+                challenge.tags.add(*tags)
+
+    def test_search_in_categories(self):
+        results = SearchEngine.search_in_categories("crypt", member=self.member)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(results), 50)
+        with self.assertNumQueries(1):
+            page = results[0:25]
+        self.assertEqual(len(page), 25)
+        self.assertTrue(all(result.category == "category" for result in page))
+
+    def test_search_in_tags(self):
+        results = SearchEngine.search_in_tags("rsa", member=self.member)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(results), 50)
+        with self.assertNumQueries(1):
+            page = results[25:50]
+        self.assertEqual(len(page), 25)
+        self.assertEqual(len({result.link for result in page}), 25)
+
+
+class HedgedocProvisioningTest(TestCase):
+    """
+    Saving a member loaded before its HedgeDoc account got provisioned must not queue it again
+    """
+
+    def test_stale_member_save(self):
+        team = Team.objects.create(name="team", email="team@ctfpad.localdomain")
+        member = Member(user=User.objects.create_user("player"), team=team)
+        member.save()
+        stale = Member.objects.get(pk=member.pk)
+
+        with mock.patch("ctfpad.models.register_new_hedgedoc_user", return_value=True):
+            self.assertEqual(HedgedocProvisioningJob.run_due(), 1)
+
+        stale.description = "updated"
+        stale.save()
+        member.refresh_from_db()
+        self.assertEqual(member.hedgedoc_status, "provisioned")
+        self.assertTrue(member.hedgedoc_password)
+        self.assertEqual(member.description, "updated")
+        self.assertFalse(HedgedocProvisioningJob.objects.exists())
+
+
+class CtfStatsRankingTest(TestCase):
+    """
+    The ranking is computed from a (CTF x member) matrix: 200 CTFs x 50 members must cost a constant number of queries
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        team = Team.objects.create(name="team", email="team@ctfpad.localdomain")
+        users = User.objects.bulk_create(User(username=f"player-{j}") for j in range(50))
+        members = Member.objects.bulk_create(Member(user=user, team=team) for user in users)
+
+        cls.year = datetime.now().year - 1
+        start = datetime(cls.year, 1, 1)
+        ctfs = Ctf.objects.bulk_create(
+            Ctf(name=f"ctf-{i}", visibility="public", rating=10.0, start_date=start + timedelta(days=i), end_date=start + timedelta(days=i + 1))
+            for i in range(200)
+        )
+        challenges = Challenge.objects.bulk_create(
+            Challenge(name=f"challenge-{i}", ctf=ctf, points=100, flag="flag", status="solved") for i, ctf in enumerate(ctfs)
+        )
+        # every CTF is played by 10 of the members, every member plays 40 CTFs
+        Challenge.solvers.through.objects.bulk_create(
+            Challenge.solvers.through(challenge=challenge, member=member)
+            for i, challenge in enumerate(challenges)
+            for j, member in enumerate(members)
+            if (i + j) % 5 == 0
+        )
+        CtfStats.rebuild()
+
+    def test_ranking_stats(self):
+        with self.assertNumQueries(3):
+            ranking = CtfStats(self.year).ranking_stats()
+
+        self.assertEqual(len(ranking["alltime"]), 50)
+        self.assertEqual(len(ranking["last_ctfs"]), 200)
+        self.assertEqual(ranking["last_ctfs"][0].name, "ctf-199")
+        for member in ranking["alltime"]:
+            self.assertEqual(member.rating_accu, 40.0)
+            self.assertEqual(member.percent, 2.0)
+            self.assertEqual(len(member.ratings), 200)
+        for ctf in ranking["last_ctfs"]:
+            self.assertEqual([percent for _, percent in ctf.ranking[:11]], [10.0] * 10 + [0.0])
+
+
+class CtfStatsIncrementalTest(TestCase):
+    """
+    The aggregate tables maintained from the signals must match the ones rebuilt from scratch
+    """
+
+    def snapshot(self) -> tuple:
+        return (
+            sorted((score.ctf_id, score.member_id, round(score.points, 6), score.solve_count) for score in MemberCtfScore.objects.all()),
+            sorted(MemberYearStats.objects.values_list("member", "year", "play_count")),
+            sorted(CategoryYearStats.objects.values_list("category", "year", "solve_count")),
+        )
+
+    def assertUpToDate(self):
+        incremental = self.snapshot()
+        CtfStats.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_incremental_updates(self):
+        team = Team.objects.create(name="team", email="team@ctfpad.localdomain")
+        members = []
+        for i in range(4):
+            member = Member(user=User.objects.create_user(f"player-{i}"), team=team)
+            member.save()
+            members.append(member)
+        crypto, pwn = ChallengeCategory.objects.create(name="crypto"), ChallengeCategory.objects.create(name="pwn")
+        ctfs = [
+            Ctf.objects.create(name=f"ctf-{year}", created_by=members[0], visibility="public", start_date=datetime(year, 6, 1), end_date=datetime(year, 6, 2))
+            for year in (2022, 2023)
+        ]
+        challenges = []
+        for i in range(6):
+            challenge = Challenge(name=f"challenge-{i}", ctf=ctfs[i % 2], category=(crypto, pwn)[i % 3 == 0], points=100 * (i + 1))
+            challenge.save()
+            challenges.append(challenge)
+
+        challenges[0].solvers.add(*members[:3])
+        challenges[1].solvers.add(members[0])
+        challenges[2].solvers.add(members[1], members[3])
+        members[2].solved_challenges.add(challenges[1], challenges[3], challenges[4])
+        self.assertUpToDate()
+
+        challenges[0].solvers.remove(members[1])
+        members[3].solved_challenges.clear()
+        challenges[4].solvers.clear()
+        self.assertUpToDate()
+
+        challenges[1].points = 50
+        challenges[1].category = pwn
+        challenges[1].save()
+        challenges[5].last_update_by = members[3]
+        challenges[5].flag = "flag"
+        challenges[5].save()
+        self.assertUpToDate()
+
+        challenges[2].ctf = ctfs[1]
+        challenges[2].save()
+        self.assertUpToDate()
+
+        Challenge.objects.get(pk=challenges[0].pk).delete()
+        ctfs[1].start_date = datetime(2022, 7, 1)
+        ctfs[1].save()
+        self.assertUpToDate()
+
+        Ctf.objects.get(pk=ctfs[0].pk).delete()
+        self.assertUpToDate()
+
+    def test_member_deletion(self):
+        team = Team.objects.create(name="team", email="team@ctfpad.localdomain")
+        members = []
+        for i in range(3):
+            member = Member(user=User.objects.create_user(f"player-{i}"), team=team)
+            member.save()
+            members.append(member)
+        ctfs = [
+            Ctf.objects.create(name=f"ctf-{i}", created_by=members[i], visibility="public", start_date=datetime(2023, 6, 1), end_date=datetime(2023, 6, 2))
+            for i in range(2)
+        ]
+        challenges = []
+        for ctf in ctfs:
+            challenge = Challenge(name="challenge", ctf=ctf, category=ChallengeCategory.objects.get_or_create(name="crypto")[0], points=300)
+            challenge.save()
+            challenge.solvers.add(*members)
+            challenges.append(challenge)
+
+        # the co-solver's share goes to the remaining solvers, and the CTF it created goes along with it
+        Member.objects.get(pk=members[1].pk).delete()
+        self.assertEqual(MemberCtfScore.objects.get(ctf=ctfs[0], member=members[0]).points, 150)
+        self.assertFalse(Ctf.objects.filter(pk=ctfs[1].pk).exists())
+        self.assertUpToDate()
+
+
+class CtfCountersTest(TestCase):
+    """
+    The progress counters maintained from the challenge signals must match the ones recomputed from the challenges
+    """
+
+    def counters(self, ctf: Ctf) -> tuple:
+        ctf.refresh_from_db()
+        return tuple(getattr(ctf, name) for name in Ctf.COUNTER_FIELDS)
+
+    def test_challenge_moved_to_another_ctf(self):
+        member = Member(user=User.objects.create_user("player"), team=Team.objects.create(name="team", email="team@ctfpad.localdomain"))
+        member.save()
+        ctfs = [Ctf.objects.create(name=f"ctf-{i}", created_by=member, visibility="private") for i in range(2)]
+        for i, status in enumerate(("solved", "unsolved")):
+            Challenge(name=f"challenge-{i}", ctf=ctfs[0], points=100 * (i + 1), status=status).save()
+        self.assertEqual(self.counters(ctfs[0]), (2, 1, 300, 100))
+
+        challenge = Challenge.objects.get(name="challenge-0")
+        challenge.ctf = ctfs[1]
+        challenge.points = 150
+        challenge.save()
+        self.assertEqual(self.counters(ctfs[0]), (1, 0, 200, 0))
+        self.assertEqual(self.counters(ctfs[1]), (1, 1, 150, 150))
+        self.assertEqual(Ctf.reconcile_counters(), 0)
+
+
+class MemberStatsQueryCountTest(TestCase):
+    """
+    Listing members with their stats must cost a constant number of queries, whatever the team size
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.team = Team.objects.create(name="team", email="team@ctfpad.localdomain")
+        organizer = Member(user=User.objects.create_user("organizer"), team=Team.objects.create(name="organizers", email="organizers@ctfpad.localdomain"))
+        organizer.save()
+        cls.ctf = Ctf.objects.create(name="ctf", created_by=organizer, visibility="public")
+        cls.categories = [ChallengeCategory.objects.create(name="crypto"), ChallengeCategory.objects.create(name="pwn")]
+
+    def add_members(self, count: int):
+        start = self.team.member_set.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(f"player-{i}", f"player-{i}@ctfpad.localdomain", "password")
+            member = Member(user=user, team=self.team, selected_ctf=self.ctf)
+            member.save()
+            for j, points in enumerate((100, 200 + i)):
+                challenge = Challenge(name=f"challenge-{i}-{j}", ctf=self.ctf, category=self.categories[j], points=points, status="solved")
+                challenge.save()
+                challenge.solvers.add(member)
+
+    def list_members(self):
+        return [
+            (member.username, member.selected_ctf.name, member.best_category(), member.is_active, member.solve_count, member.solved_points)
+            for member in self.team.members
+        ]
+
+    def test_constant_query_count(self):
+        self.add_members(2)
+        with self.assertNumQueries(1):
+            self.list_members()
+
+        self.add_members(10)
+        with self.assertNumQueries(1):
+            rows = self.list_members()
+
+        self.assertEqual(len(rows), 12)
+        for username, _, best_category, is_active, solve_count, solved_points in rows:
+            member = Member.objects.get(user__username=username)
+            self.assertEqual(best_category, member.best_category())
+            self.assertEqual(best_category, "pwn")
+            self.assertEqual(is_active, member.is_active)
+            self.assertEqual(solve_count, 2)
+            self.assertEqual(solved_points, sum(member.solved_public_challenges.values_list("points", flat=True)))
+
+
+class CtfDetailViewQueryCountTest(TestCase):
+    """
+    The CTF detail page must be rendered with a constant number of queries, whatever the number of challenges
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        team = Team.objects.create(name="team", email="team@ctfpad.localdomain")
+        cls.user = User.objects.create_user("player", "player@ctfpad.localdomain", "password")
+        member = Member(user=cls.user, team=team)
+        member.save()
+
+        cls.ctf = Ctf.objects.create(name="ctf", created_by=member, visibility="private")
+        member.selected_ctf = cls.ctf
+        member.save()
+
+        categories = [ChallengeCategory.objects.create(name=name) for name in ("crypto", "pwn", "web")]
+        for i in range(100):
+            challenge = Challenge(name=f"challenge-{i}", ctf=cls.ctf, category=categories[i % 3], points=100, last_update_by=member)
+            challenge.save()
+            if i % 4 == 0:
+                challenge.flag = f"flag-{i}"
+                challenge.save()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_detail_query_count(self):
+        # session, user, ctf, challenges, players, timeline, then the navbar member, team and selected ctf
+        with self.assertNumQueries(9):
+            response = self.client.get(reverse("ctfpad:ctfs-detail", kwargs={"pk": self.ctf.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["challenges"]), 100)
+        self.assertContains(response, "Solved/Total challenges: 25/100")
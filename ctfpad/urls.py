@@ -1,7 +1,9 @@
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
+from django.views.decorators.cache import cache_control
 from django.views.generic.base import RedirectView
+from django.views.static import serve
 from django.contrib.staticfiles.storage import staticfiles_storage
 
 from ctfpad import views
@@ -40,11 +42,16 @@ urlpatterns = [
 
     # search
     path("search/", views.search, name="search"),
+    path("search/suggest/", views.search_suggest, name="search-suggest"),
 
     # stats
     path("stats/", views.generate_stats, name="stats-detail"),
     path("stats/<int:year>/", views.generate_stats, name="stats-detail"),
 
+    # integrations health
+    path("status/hedgedoc/", views.hedgedoc_status, name="hedgedoc-status"),
+    path("status/search-cache/", views.search_cache_status, name="search-cache-status"),
+
     # toggle dark mode
     path("toggle-theme/", views.toggle_dark_mode, name="set-dark-mode"),
 
@@ -82,5 +89,15 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
+    # ctf logos: thumbnails are named after their content hash, so they can be cached forever. Out of DEBUG, the
+    # web server serves `CTF_LOGO_ROOT` (see conf/nginx/nginx.conf)
+    urlpatterns += [
+        path(
+            settings.CTF_LOGO_URL.lstrip("/") + "<path:path>",
+            cache_control(public=True, max_age=settings.CTF_LOGO_CACHE_MAX_AGE, immutable=True)(serve),
+            {"document_root": settings.CTF_LOGO_ROOT},
+            name="ctf-logos",
+        ),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.CTF_CHALLENGE_FILE_URL, document_root=settings.CTF_CHALLENGE_FILE_ROOT)
\ No newline at end of file
@@ -4,7 +4,7 @@ from django.contrib.messages.views import SuccessMessageMixin
 from django.urls.base import reverse, reverse_lazy
 from ctfpad.decorators import only_if_authenticated_user
 from django.http.request import HttpRequest
-from django.http.response import HttpResponse
+from django.http.response import HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
 from django.core.paginator import Paginator
 from django.shortcuts import redirect
@@ -22,11 +22,15 @@ from . import (
     tags,
 )
 
+from ..health import hedgedoc_health
+from ..suggestions import prefix_index
 from ..models import (
-    Ctf, CtfStats, SearchEngine, Team,
+    Ctf, CtfStats, SearchCache, SearchEngine, Team,
     Member,
 )
 
+from ctftools.settings import SEARCH_SUGGEST_LIMIT
+
 
 def index(request: HttpRequest) -> HttpResponse:
     """
@@ -55,9 +59,9 @@ def dashboard(request: HttpRequest) -> HttpResponse:
     user = request.user
     member = user.member
     if member.is_guest:
-        members = Member.objects.filter( selected_ctf = member.selected_ctf )
+        members = Member.objects.with_stats().filter( selected_ctf = member.selected_ctf )
     else:
-        members = Member.objects.all()
+        members = Member.objects.with_stats()
     latest_ctfs = member.ctfs.order_by("-start_date")
     now = datetime.datetime.now()
     nb_ctf_played = member.ctfs.count()
@@ -97,13 +101,10 @@ def generate_stats(request: HttpRequest, year: int = None) -> HttpResponse:
     context = {
         "team": Team.objects.first(),
         "members": stats.members(),
-        "player_activity": stats.player_activity(),
-        "category_stats": stats.category_stats(),
-        "ctf_stats": stats.ctf_stats(),
-        "ranking_stats": stats.ranking_stats(),
         "year_stats": stats.year_stats(),
         "year_pick": year
     }
+    context.update(stats.cached_stats())
     return render(request, "ctfpad/stats/detail.html", context)
 
 
@@ -124,20 +125,74 @@ def search(request: HttpRequest) -> HttpResponse:
         messages.warning(request, f"No search pattern given")
         return redirect("ctfpad:dashboard")
 
-    search = SearchEngine(q)
+    search = SearchEngine(q, fuzzy=request.GET.get("fuzzy") == "1", member=request.user.member)
     paginator = Paginator(search.results, 25)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     context = {
         "q": q,
+        "fuzzy": search.fuzzy,
         "selected_category": search.selected_category or "All",
-        "total_result": len(search.results),
+        "total_result": paginator.count,
+        "category_counts": search.results.counts,
+        "dropped_categories": search.results.dropped,
         "page_obj": page_obj,
         "paginator": paginator,
     }
     return render(request, "search/list.html", context)
 
 
+@only_if_authenticated_user
+def search_suggest(request: HttpRequest) -> JsonResponse:
+    """Suggest CTF, challenge, tag & member names starting with the given prefix, for search-as-you-type
+
+    Args:
+        request (HttpRequest): [description]
+
+    Returns:
+        JsonResponse: [description]
+    """
+    q = request.GET.get("q", "")
+    try:
+        limit = min(int(request.GET.get("limit", SEARCH_SUGGEST_LIMIT)), SEARCH_SUGGEST_LIMIT)
+    except ValueError:
+        limit = SEARCH_SUGGEST_LIMIT
+
+    return JsonResponse({
+        "q": q,
+        "results": prefix_index.lookup(q, limit, request.user.member),
+    })
+
+
+@only_if_authenticated_user
+def hedgedoc_status(request: HttpRequest) -> JsonResponse:
+    """Report the HedgeDoc URL in use, and the last probe results of each candidate URL
+
+    Args:
+        request (HttpRequest): [description]
+
+    Returns:
+        JsonResponse: [description]
+    """
+    return JsonResponse({
+        "base_url": hedgedoc_health.base_url,
+        "candidates": hedgedoc_health.status,
+    })
+
+
+@only_if_authenticated_user
+def search_cache_status(request: HttpRequest) -> JsonResponse:
+    """Report the search cache hit/miss counters, counted once per search
+
+    Args:
+        request (HttpRequest): [description]
+
+    Returns:
+        JsonResponse: [description]
+    """
+    return JsonResponse(SearchCache.stats())
+
+
 @only_if_authenticated_user
 def toggle_dark_mode(request: HttpRequest) -> HttpResponse:
     """Toggle dark mode cookie for user
@@ -16,7 +16,7 @@ from ctfpad.forms import (
     ChallengeSetFlagForm,
     ChallengeFileCreateForm,
 )
-from ctfpad.models import Challenge, Ctf
+from ctfpad.models import Challenge, Ctf, NoteSnapshot
 from ctftools.settings import HEDGEDOC_URL
 
 from ctfpad.helpers import (
@@ -157,7 +157,7 @@ class ChallengeExportAsGithubPageView(LoginRequiredMixin, DetailView):
             title=c.name, author=u.username, tags=tags)
         if c.description:
             content += f"Description:\n> {c.description}\n\n"
-        content += export_challenge_note(u, c.note_id)
+        content += export_challenge_note(u, c.note_id, NoteSnapshot.versions([c.note_id]))
         response = HttpResponse(
             content, content_type="text/markdown; charset=utf-8")
         response["Content-Length"] = len(content)
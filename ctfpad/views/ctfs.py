@@ -3,7 +3,7 @@ from ctfpad.decorators import only_if_authenticated_user
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
 from django.http.request import HttpRequest
-from django.http.response import HttpResponse
+from django.http.response import StreamingHttpResponse
 from django.shortcuts import render
 from django.views.generic import ListView, DetailView, UpdateView, DeleteView, CreateView
 from django.urls import reverse, reverse_lazy
@@ -18,11 +18,11 @@ from ctfpad.forms import (
     CategoryCreateForm,
     CtfCreateUpdateForm, TagCreateForm,
 )
-from ctfpad.models import Ctf, Team
+from ctfpad.models import Ctf, CtftimeEvent, Team
 from ctfpad.helpers import (
-    ctftime_ctfs,
     ctftime_get_ctf_info,
-    ctftime_parse_date
+    ctftime_parse_date,
+    ctftime_parse_logo_url,
 )
 
 
@@ -36,8 +36,9 @@ class CtfListView(LoginRequiredMixin, MembersOnlyMixin, ListView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
+        Ctf.resolve_ctftime_logos(ctx["page_obj"])
         ctx |= {
-            "ctftime_ctfs": ctftime_ctfs(running=True, future=True)
+            "ctftime_ctfs": CtftimeEvent.current_and_future(running=True, future=True)
         }
         return ctx
 
@@ -84,6 +85,7 @@ class CtfCreateView(LoginRequiredMixin, MembersOnlyMixin, SuccessMessageMixin, C
             form.instance.description = ctf["description"]
             form.instance.start_date = ctftime_parse_date(ctf["start"])
             form.instance.end_date = ctftime_parse_date(ctf["finish"])
+            form.instance.ctftime_logo = ctftime_parse_logo_url(ctf)
 
         form.instance.created_by = self.request.user.member
         return super().form_valid(form)
@@ -130,7 +132,10 @@ class CtfDetailView(LoginRequiredMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
+        challenges = self.object.challenge_set.select_related("category")
         ctx |= {
+            "challenges": list(challenges),
+            "players": list(self.object.players.select_related("user")),
             "team_timeline": self.object.team_timeline(),
         }
         return ctx
@@ -157,6 +162,9 @@ class CtfUpdateView(LoginRequiredMixin, MembersOnlyMixin, SuccessMessageMixin, U
         if "visibility" in form.changed_data and self.request.user.member != form.instance.created_by:
             messages.error(self.request, f"Visibility can only by updated by {form.instance.created_by}")
             return render(self.request, self.template_name, {'form': form})
+        if "ctftime_id" in form.changed_data:
+            form.instance.ctftime_logo = ""
+            form.instance.ctftime_logo_thumbnail = ""
         return super().form_valid(form)
 
 
@@ -177,7 +185,6 @@ class CtfExportNotesView(LoginRequiredMixin, DetailView):
 
     def get(self, request, *args, **kwargs):
         self.ctf = self.get_object()
-        response = HttpResponse(content_type="application/zip")
-        zip_filename = self.ctf.export_notes_as_zipstream(response, request.user.member)
-        response["Content-Disposition"] = f"attachment; filename={zip_filename}"
+        response = StreamingHttpResponse(self.ctf.export_notes_as_zipstream(request.user.member), content_type="application/zip")
+        response["Content-Disposition"] = f"attachment; filename={self.ctf.notes_archive_name}"
         return response
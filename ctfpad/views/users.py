@@ -212,6 +212,7 @@ class MemberDeleteView(LoginRequiredMixin, RequireSuperPowersMixin, SuccessMessa
 
 class MemberListView(LoginRequiredMixin, RequireSuperPowersMixin, ListView):
     model = Member
+    queryset = Member.objects.with_stats()
     template_name = "users/list.html"
     login_url = "/users/login/"
     redirect_field_name = "redirect_to"
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django.contrib.humanize',
     'django.contrib.sites',
+    'django.contrib.postgres',
     'model_utils',
     'ctfpad',
 ]
@@ -106,6 +107,20 @@ DATABASES = {
     }
 }
 
+# The cache is shared by the web server and the background workers, which bump the versions of the cached search
+# results, stats and timelines
+CTFPAD_REDIS_URL = os.getenv("CTFPAD_REDIS_URL")
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CTFPAD_REDIS_URL,
+    } if CTFPAD_REDIS_URL else {
+        # only fit for a single process, e.g. the development server without the workers
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -159,14 +174,36 @@ USERS_FILE_URL  = "/uploads/media/"
 USERS_FILE_PATH = "media/"
 USERS_FILE_ROOT = MEDIA_ROOT / USERS_FILE_PATH
 
+CTF_LOGO_URL  = "/uploads/logos/"
+CTF_LOGO_PATH = "logos/"
+CTF_LOGO_ROOT = MEDIA_ROOT / CTF_LOGO_PATH
+
 CTFPAD_URL = os.getenv("CTFPAD_URL") or 'http://localhost:8000'
 HEDGEDOC_URL = os.getenv("HEDGEDOC_URL") or 'http://localhost:3000'
 USE_INTERNAL_HEDGEDOC = os.getenv("USE_INTERNAL_HEDGEDOC") in ["1", "True", "true", True]
+HEDGEDOC_INTERNAL_URL = 'http://hedgedoc:3000'
+HEDGEDOC_HEALTH_CHECK_INTERVAL = 30
+HEDGEDOC_PROVISIONING_MAX_ATTEMPTS = 8
+HEDGEDOC_PROVISIONING_RETRY_DELAY = 30 # seconds, doubled after each failed attempt
+HEDGEDOC_PROVISIONING_CLAIM_TIMEOUT = 10 * 60 # seconds, after which a job claimed by a worker that died is due again
+HEDGEDOC_EXPORT_MAX_CONCURRENT_REQUESTS = 4
+HEDGEDOC_SYNC_MAX_CONCURRENT_REQUESTS = 4
+NOTE_SNAPSHOT_FREEZE_DELAY = 7 # days after the end of a CTF, after which its notes are not synchronized anymore
 EXCALIDRAW_URL = os.getenv("EXCALIDRAW_URL") or 'http://localhost:5010'
 
 CTFTIME_URL = "https://ctftime.org"
 CTFTIME_API_EVENTS_URL = "https://ctftime.org/api/v1/events/"
 CTFTIME_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:12.0) Gecko/20100101 Firefox/12.0"
+CTFTIME_MAX_CONCURRENT_REQUESTS = 8
+
+# Outbound HTTP integrations (CTFTime, HedgeDoc, Discord)
+
+HTTP_CLIENT_TIMEOUT = (3.05, 10) # (connect, read) in seconds
+HTTP_CLIENT_RETRIES = 2
+HTTP_CLIENT_BACKOFF_FACTOR = 0.5
+HTTP_CLIENT_POOL_SIZE = 10
+HTTP_CLIENT_CIRCUIT_FAILURES = 5
+HTTP_CLIENT_CIRCUIT_RESET_TIMEOUT = 30
 
 LOGIN_REDIRECT_URL = "ctfpad:dashboard"
 FILE_UPLOAD_MAX_MEMORY_SIZE = 2 * 1024 * 1024
@@ -178,6 +215,18 @@ SHORT_DATETIME_FORMAT = 'Y-m-d P'
 
 CTFPAD_DEFAULT_CTF_LOGO = "blank-ctf.png"
 CTFPAD_ACCEPTED_IMAGE_EXTENSIONS = (".png", ".jpg", ".gif", ".bmp")
+CTF_LOGO_MAX_SIZE = FILE_UPLOAD_MAX_MEMORY_SIZE
+CTF_LOGO_ACCEPTED_FORMATS = ("PNG", "JPEG", "GIF", "BMP") # as detected by Pillow
+CTF_LOGO_THUMBNAIL_SIZES = {"small": 50, "large": 150}
+CTF_LOGO_CACHE_MAX_AGE = 365 * 24 * 3600
+
+SEARCH_CONFIG = "english" # PostgreSQL text search configuration
+SEARCH_TIMEOUT = 2.0 # seconds, after which the search categories still running are left out of the results
+SEARCH_MAX_CONCURRENT_QUERIES = 8 # per process, each search thread keeps its own database connection
+SEARCH_CACHE_TIMEOUT = 15 * 60 # seconds
+SEARCH_SUGGEST_LIMIT = 10
+SCORE_GRAPH_MAX_POINTS = 200 # points of the cumulative score graph of the member profiles
+STATS_CACHE_TIMEOUT = 24 * 60 * 60 # seconds, stats of a year are also invalidated whenever its challenges change
 
 # EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 # EMAIL_FILE_PATH = MEDIA_ROOT / "email_sent"